@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from feet_template import FEET_SENSORS
+
+# Spacing assumed for a window of a single sample.
+DEFAULT_SAMPLE_INTERVAL = np.timedelta64(1, "s")
+EPISODE_COLUMNS = [
+    "sensor",
+    "start",
+    "end",
+    "until",
+    "duration",
+    "peak",
+    "samples",
+]
+
+
+def empty_episodes():
+    return pd.DataFrame(columns=EPISODE_COLUMNS)
+
+
+def anomaly_episodes(sensors, sensors_list=FEET_SENSORS):
+    # Episodes are runs of anomalous samples. All sensors are handled in
+    # one pass: the rising and falling edges of the zero-padded masks give
+    # the run bounds, one reduceat over the flattened values the peaks.
+    n = len(sensors)
+    if not n:
+        return empty_episodes()
+
+    timestamps = sensors["measured_at"].to_numpy(dtype="datetime64[ns]")
+    anomalies = sensors[[f"{s}_anom" for s in sensors_list]].to_numpy() > 0
+    values = sensors[[f"{s}_val" for s in sensors_list]].to_numpy(
+        dtype=np.float64
+    )
+
+    mask = np.zeros((len(sensors_list), n + 2), dtype=np.int8)
+    mask[:, 1:-1] = anomalies.T
+    edges = np.diff(mask, axis=1)
+    sensor_ids, starts = np.nonzero(edges == 1)
+    # Both come out sensor by sensor, so starts and ends pair up.
+    ends = np.nonzero(edges == -1)[1]
+    if not len(starts):
+        return empty_episodes()
+
+    flat = np.append(values.T.ravel(), -np.inf)
+    offsets = sensor_ids * n
+    bounds = np.empty(2 * len(starts), dtype=np.int64)
+    bounds[0::2] = offsets + starts
+    bounds[1::2] = offsets + ends
+    peaks = np.maximum.reduceat(flat, bounds)[0::2]
+
+    start = timestamps[starts]
+    end = timestamps[ends - 1]
+    # First normal sample after the episode, used as the right edge of its
+    # shaded region. Episodes still running at the last sample have none,
+    # so they reach one sample interval past it instead of ending there.
+    interval = (
+        timestamps[-1] - timestamps[-2] if n > 1 else DEFAULT_SAMPLE_INTERVAL
+    )
+    until = np.where(
+        ends < n, timestamps[np.minimum(ends, n - 1)], end + interval
+    )
+    return pd.DataFrame(
+        {
+            "sensor": np.asarray(sensors_list)[sensor_ids],
+            "start": start,
+            "end": end,
+            "until": until,
+            "duration": (end - start) / np.timedelta64(1, "s"),
+            "peak": peaks,
+            "samples": ends - starts,
+        },
+        columns=EPISODE_COLUMNS,
+    )
@@ -1,27 +1,59 @@
+import os
+import uuid
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_table
 import numpy as np
 import pandas as pd
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
+
+from anomalies import anomaly_episodes
+from database.cache import create_snapshot_cache
+from database.data import (get_patient_history, get_patient_version,
+                           get_patient_window, get_patients_df,
+                           get_patients_version, get_sensor_rollups,
+                           get_sensor_summaries, get_ward_overview,
+                           get_ward_version)
+from database.db import RETENTION_MINUTES, use_read_only_engine
+from database.rollups import ROLLUP_RESOLUTIONS, ROLLUP_RETENTION
+from downsampling import rollup_resolution
+from feet_template import FEET_SENSORS, FEET_TEXTBOXES, build_feet_template
+from instrumentation import instrument_callback, register_metrics
+from push import PUSH_PORT
+from serialization import compact_figure, epoch_ms
+from stats import summary_stats
+from utils import (create_data_plot, feet_state, parse_xaxis_range,
+                   update_anomalies_figure, update_history_figure)
+from ward import build_ward_figure
 
-from database.data import get_all_patient_sensors, get_patients_df
-from utils import (create_data_plot, create_figure, create_sensor_textbox,
-                   parse_xaxis_range, update_anomalies_figure,
-                   update_history_figure, сreate_dynamic_sensors)
+use_read_only_engine()
 
 app = dash.Dash(__name__)
+register_metrics(app.server)
 
 header = "Simple Plotly Dash Steps Tracking Application"
 
+# Where browsers open the event stream of push.py; empty means PUSH_PORT on
+# the host the dashboard was loaded from.
+PUSH_EVENTS_URL = os.environ.get("PUSH_EVENTS_URL", "")
+
+# Points kept in the History trace while it is extended tick by tick.
+DATA_PLOT_POINTS = RETENTION_MINUTES * 60
+
 data_plot = create_data_plot()
-feet = create_figure(app)
+episode_cache = create_snapshot_cache()
+# Rendered figures, shared between server workers with the file backend.
+figure_cache = create_snapshot_cache()
+feet = build_feet_template(app.get_asset_url("image.png"))
 
 
 app.layout = html.Div(
     children=[
+        dcc.Location(id="url"),
         html.Div(
+            id="patient-page",
             className="row",
             children=[
                 html.Div(
@@ -30,6 +62,7 @@ app.layout = html.Div(
                         html.H1(
                             children=header, style={"text-align": "center"}
                         ),
+                        dcc.Link("Ward overview", href="/ward"),
                         html.Div(
                             className="div-for-dropdown",
                             children=[
@@ -155,32 +188,105 @@ app.layout = html.Div(
                 ),
             ],
         ),
+        html.Div(
+            id="ward-page",
+            className="row",
+            style={"display": "none"},
+            children=[
+                html.H1(
+                    children="Ward overview", style={"text-align": "center"}
+                ),
+                dcc.Link("Patient view", href="/"),
+                dcc.Graph(id="ward-graph", config={"displayModeBar": False}),
+                dcc.Interval(
+                    id="ward-interval",
+                    interval=1 * 1000,
+                    n_intervals=0,
+                    disabled=True,
+                ),
+                dcc.Store(id="ward-seen"),
+            ],
+        ),
+        # Only the patient list is still polled; sensor updates are pushed
+        # over the push.py event stream, whose handler clicks push-trigger
+        # to turn the latest message into update-signal.
         dcc.Interval(
-            id="interval-component", interval=1 * 1000, n_intervals=0
+            id="interval-component", interval=10 * 1000, n_intervals=0
+        ),
+        html.Button(id="push-trigger", n_clicks=0, style={"display": "none"}),
+        dcc.Store(
+            id="push-config", data={"url": PUSH_EVENTS_URL, "port": PUSH_PORT}
         ),
+        dcc.Store(id="push-subscription"),
+        dcc.Store(id="update-signal"),
+        dcc.Store(id="feet-state"),
+        dcc.Store(id="data-plot-base"),
+        dcc.Store(id="data-plot-tail"),
+        # Inputs and data versions each callback last rendered.
+        dcc.Store(id="patients-seen"),
+        dcc.Store(id="bio-seen"),
+        dcc.Store(id="feet-seen"),
+        dcc.Store(id="data-plot-seen"),
     ]
 )
 
 
+@app.callback(
+    Output("patient-page", "style"),
+    Output("ward-page", "style"),
+    Output("ward-interval", "disabled"),
+    Input("url", "pathname"),
+)
+@instrument_callback
+def display_page(pathname):
+    if pathname == "/ward":
+        return {"display": "none"}, {}, False
+    return {}, {"display": "none"}, True
+
+
+def range_key(x_range):
+    return tuple(x_range) if x_range is not None else None
+
+
+def version_token(version):
+    # Nanosecond versions do not survive a round trip through JavaScript
+    # numbers, so stores keep them as strings.
+    return str(version)
+
+
 @app.callback(
     Output("patient_selector", "options"),
+    Output("patients-seen", "data"),
     Input("interval-component", "n_intervals"),
+    State("patients-seen", "data"),
 )
-def update_dropdown_options(n):
+@instrument_callback
+def update_dropdown_options(n, seen):
+    key = [version_token(get_patients_version())]
+    if key == seen:
+        return dash.no_update, dash.no_update
+
     patients_df = get_patients_df()
     return [
         {"label": f'{row["firstname"]} {row["lastname"]}', "value": row.name}
         for i, row in patients_df.iterrows()
-    ]
+    ], key
 
 
 @app.callback(
     Output("div-for-bio", "columns"),
     Output("div-for-bio", "data"),
+    Output("bio-seen", "data"),
     Input("patient_selector", "value"),
-    Input("interval-component", "n_intervals"),
+    Input("update-signal", "data"),
+    State("bio-seen", "data"),
 )
-def update_patient_info(patient_id, n):
+@instrument_callback
+def update_patient_info(patient_id, signal, seen):
+    key = [patient_id, version_token(get_patients_version())]
+    if key == seen:
+        return dash.no_update, dash.no_update, dash.no_update
+
     if patient_id is not None:
         patients_df = get_patients_df()
         patient = patients_df.loc[patient_id, :]
@@ -190,84 +296,251 @@ def update_patient_info(patient_id, n):
         patient_info.columns = ["Info", "Value"]
         return [
             {"name": i, "id": i} for i in patient_info.columns
-        ], patient_info.to_dict("records")
+        ], patient_info.to_dict("records"), key
     else:
         empty_df = pd.DataFrame(
             np.empty((4, 2), dtype=object), columns=["Info", "Value"]
         )
         return [
             {"name": i, "id": i} for i in empty_df.columns
-        ], empty_df.to_dict("records")
+        ], empty_df.to_dict("records"), key
 
 
 @app.callback(
-    Output("feet-graph", "figure"),
+    Output("feet-state", "data"),
+    Output("feet-seen", "data"),
     Input("patient_selector", "value"),
     Input("data-plot", "relayoutData"),
-    Input("interval-component", "n_intervals"),
+    Input("update-signal", "data"),
+    State("feet-seen", "data"),
 )
-def update_feet_graph(patient_id, plot_x_range, n):
-    feet = create_figure(app)
-    if patient_id is not None:
-        patient_sensors = get_all_patient_sensors(patient_id)
-
-        feet = сreate_dynamic_sensors(
-            feet,
-            patient_sensors,
-            ["L0", "L1", "L2", "R0", "R1", "R2"],
-            [160, 125, 143, 227, 262, 244],
-            [325, 295, 135, 325, 295, 135],
-        )
+@instrument_callback
+def update_feet_graph(patient_id, plot_x_range, signal, seen):
+    if patient_id is None:
+        return None, None
 
-        x_range = parse_xaxis_range(plot_x_range)
+    # relayoutData also fires for changes that keep the x range.
+    x_range = parse_xaxis_range(plot_x_range)
+    version = get_patient_version(patient_id)
+    key = [patient_id, version_token(version), x_range]
+    if key == seen:
+        return dash.no_update, dash.no_update
+    state = figure_cache.get_or_load(
+        ("feet", patient_id, range_key(x_range)),
+        version,
+        lambda: feet_graph_state(patient_id, x_range),
+    )
+    return state, key
 
-        feet = create_sensor_textbox(
-            feet, [10, 400, 97.5, 490], patient_sensors, "L0", x_range
-        )
-        feet = create_sensor_textbox(
-            feet, [10, 220, 97.5, 310], patient_sensors, "L1", x_range
-        )
-        feet = create_sensor_textbox(
-            feet, [10, 40, 97.5, 130], patient_sensors, "L2", x_range
-        )
-        feet = create_sensor_textbox(
-            feet, [290, 400, 377.5, 490], patient_sensors, "R0", x_range
-        )
-        feet = create_sensor_textbox(
-            feet, [290, 220, 377.5, 310], patient_sensors, "R1", x_range
-        )
-        feet = create_sensor_textbox(
-            feet, [290, 40, 377.5, 130], patient_sensors, "R2", x_range
+
+def feet_graph_state(patient_id, x_range):
+    if x_range is None:
+        # The unzoomed view is served from the ingester's rolling
+        # aggregates without touching the raw window.
+        summaries = get_sensor_summaries(patient_id)
+        if len(summaries) == len(FEET_SENSORS):
+            return feet_state(
+                None,
+                FEET_SENSORS,
+                FEET_TEXTBOXES,
+                None,
+                stats=summary_stats(summaries, FEET_SENSORS),
+            )
+
+    patient_sensors = get_patient_window(patient_id)
+    if patient_sensors.empty:
+        return None
+    return feet_state(patient_sensors, FEET_SENSORS, FEET_TEXTBOXES, x_range)
+
+
+@app.callback(
+    Output("ward-graph", "figure"),
+    Output("ward-seen", "data"),
+    Input("ward-interval", "n_intervals"),
+    State("ward-seen", "data"),
+)
+@instrument_callback
+def update_ward_graph(n, seen):
+    # One grouped query per batch serves every tile of every client.
+    batch, slot = get_ward_version()
+    key = [version_token(batch), slot]
+    if key == seen:
+        return dash.no_update, dash.no_update
+    return build_ward_figure(get_ward_overview(), get_patients_df()), key
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="push", function_name="subscribe"),
+    Output("push-subscription", "data"),
+    Input("patient_selector", "value"),
+    State("push-config", "data"),
+)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="push", function_name="signal"),
+    Output("update-signal", "data"),
+    Input("push-trigger", "n_clicks"),
+    State("update-signal", "data"),
+)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="feet", function_name="applyState"),
+    Output("feet-graph", "figure"),
+    Input("feet-state", "data"),
+    State("feet-graph", "figure"),
+)
+
+
+def data_plot_sensors(patient_id, sensor_name, x_range):
+    sensors = get_patient_window(patient_id)
+    if x_range is None:
+        return sensors
+    start = pd.to_datetime(x_range[0]).to_pydatetime()
+    end = pd.to_datetime(x_range[1]).to_pydatetime()
+    # Long ranges are served from the ingester's rollups, shorter ones
+    # reaching past the live window from the archive.
+    resolution = rollup_resolution(
+        x_range, ROLLUP_RESOLUTIONS, retention=ROLLUP_RETENTION
+    )
+    if resolution is not None:
+        return get_sensor_rollups(
+            patient_id, sensor_name, resolution, start, end
         )
+    if sensors.empty or start < sensors["measured_at"].iloc[0]:
+        sensors = get_patient_history(patient_id, start, end)
+    return sensors
+
+
+def data_plot_episodes(patient_id, sensor_name, x_range, sensors):
+    # Raw rows carry every sensor, so one pass serves all six tabs; rollup
+    # frames only hold the selected one.
+    if f"{sensor_name}_min" in sensors.columns:
+        sensors_list = [sensor_name]
+    else:
+        sensors_list = FEET_SENSORS
+    key = (patient_id, range_key(x_range), tuple(sensors_list))
+    return episode_cache.get_or_load(
+        key,
+        get_patient_version(patient_id),
+        lambda: anomaly_episodes(sensors, sensors_list),
+    )
 
-    return feet
+
+def data_plot_extension(new_rows, plot_type, sensor_name):
+    # Epoch milliseconds, like the x values of the rendered figure.
+    x = [epoch_ms(new_rows["measured_at"]).tolist()]
+    y = [new_rows[f"{sensor_name}_val"].tolist()]
+    traces = [0]
+    if plot_type == "Anomalies":
+        # New anomalous samples show up on their own marker trace until
+        # the next render folds them into episodes.
+        anomalous = new_rows[new_rows[f"{sensor_name}_anom"] > 0]
+        x.append(epoch_ms(anomalous["measured_at"]).tolist())
+        y.append(anomalous[f"{sensor_name}_val"].tolist())
+        traces.append(2)
+    return {"x": x, "y": y}, traces
 
 
 @app.callback(
     Output("data-plot", "figure"),
+    Output("data-plot-base", "data"),
+    Output("data-plot-seen", "data"),
     Input("patient_selector", "value"),
     Input("plot_selector", "value"),
     Input("sensors-tabs", "value"),
     Input("data-plot", "relayoutData"),
-    Input("interval-component", "n_intervals"),
+    State("data-plot-seen", "data"),
 )
-def update_data_plot(patient_id, plot_type, sensor_name, plot_x_range, n):
+@instrument_callback
+def update_data_plot(patient_id, plot_type, sensor_name, plot_x_range, seen):
+    # New rows reach the figure through extend_data_plot, so only a change
+    # of selection or x range needs a new figure.
+    x_range = parse_xaxis_range(plot_x_range)
+    key = [patient_id, plot_type, sensor_name, x_range]
+    if key == seen:
+        return dash.no_update, dash.no_update, dash.no_update
+
+    if patient_id is None or plot_type is None:
+        return create_data_plot(), None, key
+
+    data_plot, last_id, points = figure_cache.get_or_load(
+        ("data-plot", patient_id, plot_type, sensor_name, range_key(x_range)),
+        get_patient_version(patient_id),
+        lambda: render_data_plot(patient_id, plot_type, sensor_name, x_range),
+    )
+    # Later ticks only append rows newer than this one to the trace.
+    base = None
+    if last_id is not None:
+        base = {
+            "revision": uuid.uuid4().hex,
+            "last_id": last_id,
+            "points": points,
+        }
+    return data_plot, base, key
+
+
+def render_data_plot(patient_id, plot_type, sensor_name, x_range):
     data_plot = create_data_plot()
+    sensors = data_plot_sensors(patient_id, sensor_name, x_range)
+
+    if plot_type == "History":
+        data_plot = update_history_figure(
+            data_plot, sensor_name, sensors, x_range
+        )
+    elif plot_type == "Anomalies":
+        episodes = data_plot_episodes(
+            patient_id, sensor_name, x_range, sensors
+        )
+        data_plot = update_anomalies_figure(
+            data_plot, sensor_name, sensors, x_range, episodes
+        )
 
-    if patient_id is not None and plot_type is not None:
-        sensors = get_all_patient_sensors(patient_id)
-        x_range = parse_xaxis_range(plot_x_range)
+    # Rollup buckets are not extended with raw rows.
+    last_id = None
+    if f"{sensor_name}_min" not in sensors.columns:
+        last_id = int(sensors.index.max()) if not sensors.empty else 0
+    points = len(data_plot.data[0].x) if data_plot.data else 0
+    return compact_figure(data_plot.to_dict()), last_id, points
 
-        if plot_type == "History":
-            data_plot = update_history_figure(
-                data_plot, sensor_name, sensors, x_range
-            )
-        elif plot_type == "Anomalies":
-            data_plot = update_anomalies_figure(
-                data_plot, sensor_name, sensors, x_range
-            )
 
-    return data_plot
+@app.callback(
+    Output("data-plot", "extendData"),
+    Output("data-plot-tail", "data"),
+    Input("update-signal", "data"),
+    State("patient_selector", "value"),
+    State("plot_selector", "value"),
+    State("sensors-tabs", "value"),
+    State("data-plot-base", "data"),
+    State("data-plot-tail", "data"),
+)
+@instrument_callback
+def extend_data_plot(signal, patient_id, plot_type, sensor_name, base, tail):
+    if base is None or patient_id is None or plot_type is None:
+        return dash.no_update, dash.no_update
+
+    version = version_token(get_patient_version(patient_id))
+    last_id = base["last_id"]
+    if tail is not None and tail["revision"] == base["revision"]:
+        if tail["version"] == version:
+            return dash.no_update, dash.no_update
+        last_id = max(last_id, tail["last_id"])
+
+    sensors = get_patient_window(patient_id)
+    if sensors.empty or int(sensors.index[-1]) <= last_id:
+        return dash.no_update, dash.no_update
+
+    new_rows = sensors.iloc[
+        sensors.index.searchsorted(last_id, side="right"):
+    ]
+    tail = {
+        "revision": base["revision"],
+        "last_id": int(sensors.index[-1]),
+        "version": version,
+    }
+    extension, traces = data_plot_extension(new_rows, plot_type, sensor_name)
+    return [extension, traces, max(base["points"], DATA_PLOT_POINTS)], tail
 
 
 if __name__ == "__main__":
@@ -0,0 +1,38 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    feet: {
+        // Fills the static feet figure with the small per-tick state sent
+        // by update_feet_graph, so only a few hundred bytes cross the wire.
+        applyState: function (state, figure) {
+            if (!figure) {
+                return window.dash_clientside.no_update;
+            }
+            const visible = Boolean(state);
+            const layout = Object.assign({}, figure.layout);
+            layout.shapes = (layout.shapes || []).map(function (shape) {
+                return Object.assign({}, shape, {visible: visible});
+            });
+            layout.annotations = (layout.annotations || []).map(
+                function (annotation, i) {
+                    return Object.assign({}, annotation, {
+                        visible: visible,
+                        text: visible ? state.texts[i] : "",
+                    });
+                }
+            );
+
+            const markers = Object.assign({}, figure.data[0], {
+                visible: visible,
+            });
+            if (visible) {
+                markers.marker = Object.assign({}, markers.marker, {
+                    color: state.colors,
+                    size: state.sizes,
+                });
+            }
+            return Object.assign({}, figure, {
+                data: [markers].concat(figure.data.slice(1)),
+                layout: layout,
+            });
+        },
+    },
+});
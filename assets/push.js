@@ -0,0 +1,64 @@
+(function () {
+    // The latest message of the push.py event stream. Each message clicks
+    // the hidden push-trigger button, which runs the signal callback; the
+    // update-signal store is only written when the message differs from
+    // what the callbacks have seen.
+    let source = null;
+    let subscribed = null;
+    let latest = null;
+
+    function eventsUrl(config) {
+        if (config && config.url) {
+            return config.url;
+        }
+        const location = window.location;
+        return (
+            location.protocol + "//" + location.hostname + ":" +
+            config.port + "/events"
+        );
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        push: {
+            subscribe: function (patientId, config) {
+                if (patientId === subscribed) {
+                    return window.dash_clientside.no_update;
+                }
+                if (source) {
+                    source.close();
+                    source = null;
+                }
+                subscribed = patientId;
+                latest = null;
+                if (patientId !== null && patientId !== undefined) {
+                    source = new EventSource(
+                        eventsUrl(config) +
+                            "?patient=" +
+                            encodeURIComponent(patientId)
+                    );
+                    source.onmessage = function (event) {
+                        latest = JSON.parse(event.data);
+                        const trigger = document.getElementById(
+                            "push-trigger"
+                        );
+                        if (trigger) {
+                            trigger.click();
+                        }
+                    };
+                }
+                return patientId;
+            },
+            signal: function (n, current) {
+                if (
+                    latest === null ||
+                    (current &&
+                        current.patient === latest.patient &&
+                        current.version === latest.version)
+                ) {
+                    return window.dash_clientside.no_update;
+                }
+                return latest;
+            },
+        },
+    });
+})();
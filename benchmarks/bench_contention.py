@@ -0,0 +1,124 @@
+"""Reader latency while the ingester writes, for the default rollback
+journal engine and the tuned WAL engine.
+
+    python -m benchmarks.bench_contention --patients 100 --readers 8
+"""
+import argparse
+import datetime
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import create_engine
+
+from benchmarks.bench_indexes import read_patient
+from benchmarks.common import (fill_database, sensors_row, summarize,
+                               temporary_database_path)
+from database.db import Base, Sensors, create_db_engine
+
+WINDOW_ROWS = 600
+
+
+def default_engine(path, read_only=False):
+    return create_engine(
+        f"sqlite+pysqlite:///{path}",
+        connect_args={"check_same_thread": False},
+    )
+
+
+ENGINES = {
+    "default": default_engine,
+    "wal": lambda path, read_only=False: create_db_engine(
+        path, read_only=read_only
+    ),
+}
+
+
+def writer(mode, path, patients, duration, latencies):
+    engine = ENGINES[mode](path)
+    deadline = time.monotonic() + duration
+    next_tick = time.monotonic()
+    while time.monotonic() < deadline:
+        now = datetime.datetime.now()
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            connection.execute(
+                Sensors.__table__.insert(),
+                [sensors_row(p, now) for p in range(1, patients + 1)],
+            )
+            connection.execute(
+                Sensors.__table__.delete().where(
+                    Sensors.measured_at
+                    < now - datetime.timedelta(seconds=WINDOW_ROWS)
+                )
+            )
+        latencies.append(time.perf_counter() - start)
+        next_tick += 1.0
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+    engine.dispose()
+
+
+def reader(engine, patients, deadline, samples):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        read_patient(engine, random.randint(1, patients))
+        samples.append(time.perf_counter() - start)
+
+
+def run(mode, patients, readers, duration):
+    path = temporary_database_path()
+    try:
+        setup_engine = ENGINES[mode](path)
+        Base.metadata.create_all(bind=setup_engine)
+        fill_database(setup_engine, patients, WINDOW_ROWS)
+        setup_engine.dispose()
+
+        manager = multiprocessing.Manager()
+        write_latencies = manager.list()
+        write_process = multiprocessing.Process(
+            target=writer,
+            args=(mode, path, patients, duration, write_latencies),
+        )
+        write_process.start()
+
+        engine = ENGINES[mode](path, read_only=True)
+        deadline = time.monotonic() + duration
+        samples = []
+        threads = [
+            threading.Thread(
+                target=reader, args=(engine, patients, deadline, samples)
+            )
+            for _ in range(readers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        write_process.join()
+        engine.dispose()
+        return summarize(samples), summarize(list(write_latencies))
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=100)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'engine':>8} {'read p50':>10} {'read p99':>10} "
+          f"{'write p50':>10} {'write p99':>10}")
+    for mode in ENGINES:
+        read, write = run(mode, args.patients, args.readers, args.duration)
+        print(f"{mode:>8} {read['p50_ms']:>8.2f}ms {read['p99_ms']:>8.2f}ms "
+              f"{write['p50_ms']:>8.2f}ms {write['p99_ms']:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
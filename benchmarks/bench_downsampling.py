@@ -0,0 +1,61 @@
+"""History plot payload size and build time against window size, with and
+without server-side downsampling.
+
+    python -m benchmarks.bench_downsampling --rows 600 3600 36000 360000
+"""
+import argparse
+import datetime
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import SENSOR_NAMES, summarize, timed
+from utils import create_data_plot, update_history_figure
+
+
+def synthetic_window(rows):
+    end = datetime.datetime.now()
+    frame = pd.DataFrame(
+        {"measured_at": pd.date_range(end=end, periods=rows, freq="s")}
+    )
+    for name in SENSOR_NAMES:
+        frame[f"{name}_val"] = np.random.randint(0, 1024, rows)
+        frame[f"{name}_anom"] = np.random.random(rows) < 0.05
+    return frame
+
+
+def render(frame):
+    return update_history_figure(create_data_plot(), "L0", frame, None)
+
+
+def measure(frame, repeats):
+    payload = len(render(frame).to_json())
+    samples = [
+        timed(lambda: render(frame).to_json())[0] for _ in range(repeats)
+    ]
+    return summarize(samples), payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+",
+                        default=[600, 3600, 36000, 360000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'mode':>12} {'bytes':>10} {'p50':>10}")
+    for rows in args.rows:
+        frame = synthetic_window(rows)
+        with mock.patch("utils.downsample_frame",
+                        lambda frame, *args, **kwargs: frame):
+            raw = measure(frame, args.repeats)
+        downsampled = measure(frame, args.repeats)
+        for mode, (timing, payload) in (("raw", raw),
+                                        ("downsampled", downsampled)):
+            print(f"{rows:>8} {mode:>12} {payload:>10} "
+                  f"{timing['p50_ms']:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
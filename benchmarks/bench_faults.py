@@ -0,0 +1,105 @@
+"""Run the ingester against a fault-injecting monitor stand-in and report
+tick latency, failure counters and which patients still got stored. Exits
+with an error when a dead patient got stored or its breaker is not open, or
+when a live patient got nothing stored.
+
+    python -m benchmarks.bench_faults --failure-rate 0.2 --dead-patients 3
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=2.0)
+    parser.add_argument("--dead-patients", type=int, nargs="*", default=[3])
+    parser.add_argument("--port", type=int, default=9082)
+    return parser.parse_args()
+
+
+async def run(args):
+    from benchmarks.mock_monitor import create_app, start_mock_monitor
+    from database.data import store_all_patients_data
+    from database.db import init_db
+
+    init_db()
+    app = create_app(
+        failure_rate=args.failure_rate,
+        slow_rate=args.slow_rate,
+        slow_delay=args.slow_delay,
+        dead_patients=args.dead_patients,
+    )
+    runner = await start_mock_monitor(app, port=args.port)
+    try:
+        await asyncio.wait_for(store_all_patients_data(), args.duration)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await runner.cleanup()
+    # Give the writer thread a moment to commit the last batch.
+    await asyncio.sleep(0.5)
+
+
+def check_faults(args, samples, breaker):
+    # A dead endpoint hangs past the patient timeout on every tick, so its
+    # breaker opens after failure_threshold ticks and stays open for the
+    # cooldown, longer than a default run.
+    problems = []
+    for patient_id in range(1, args.patients + 1):
+        dead = patient_id in args.dead_patients
+        if dead and samples[patient_id]:
+            problems.append(f"dead patient {patient_id} was stored")
+        if dead and not breaker.is_open(str(patient_id)):
+            problems.append(f"breaker of dead patient {patient_id} is closed")
+        if not dead and not samples[patient_id]:
+            problems.append(f"patient {patient_id} was never stored")
+    return problems
+
+
+def main():
+    args = parse_args()
+    directory = tempfile.mkdtemp(prefix="bench-faults-")
+    path = os.path.join(directory, "history.sqlite")
+    # The database modules read their configuration at import time.
+    os.environ["DATABASE_PATH"] = path
+    os.environ["PATIENTS_ID_LIST"] = f"1-{args.patients}"
+    os.environ["PATIENTS_MONITOR_URL"] = (
+        f"http://127.0.0.1:{args.port}/v2/monitor/"
+    )
+    asyncio.run(run(args))
+
+    from database.metrics import REGISTRY
+
+    for name, value in REGISTRY.snapshot().items():
+        print(f"{name:>36} {value:.3f}")
+    with sqlite3.connect(path) as connection:
+        rows = dict(
+            connection.execute(
+                "SELECT patient_id, COUNT(*) FROM sensors GROUP BY patient_id"
+            ).fetchall()
+        )
+    samples = {
+        patient_id: rows.get(patient_id, 0)
+        for patient_id in range(1, args.patients + 1)
+    }
+    print("samples per patient:", samples)
+
+    from database.data import breaker
+
+    problems = check_faults(args, samples, breaker)
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Feet figure rendering: plotly graph_objects path against the precomputed
+dict template.
+
+    python -m benchmarks.bench_feet_template --repeats 200
+"""
+import argparse
+import json
+
+import dash
+import plotly
+import plotly.graph_objects as go
+
+from benchmarks.bench_downsampling import synthetic_window
+from benchmarks.common import summarize, timed
+from feet_template import (FEET_CORD_X, FEET_CORD_Y, FEET_SENSORS,
+                           FEET_TEXTBOXES, SENSOR_COLORSCALE,
+                           build_feet_template, textbox_line_positions)
+from utils import feet_state
+
+FONT = dict(family="Courier New, monospace", size=16)
+
+
+def figure_path(app, sensors):
+    # The feet figure built through plotly graph objects, as the dashboard
+    # did before the template: image, markers and textboxes on every call.
+    state = feet_state(sensors, FEET_SENSORS, FEET_TEXTBOXES, None)
+    feet = go.Figure()
+    feet.update_layout(
+        width=1094,
+        height=800,
+        margin=dict(l=0, r=0, t=0, b=0),
+        paper_bgcolor="Black",
+        plot_bgcolor="Black",
+    )
+    feet.add_layout_image(
+        dict(
+            source=app.get_asset_url("image.png"),
+            xref="x",
+            yref="y",
+            x=100,
+            y=420,
+            sizex=700,
+            sizey=350,
+            sizing="contain",
+            layer="below",
+        )
+    )
+    feet.update_xaxes(range=[0, 390], showgrid=False, visible=False)
+    feet.update_yaxes(range=[0, 490], showgrid=False, visible=False)
+    feet.add_scatter(
+        x=FEET_CORD_X,
+        y=FEET_CORD_Y,
+        mode="markers",
+        marker=dict(
+            colorscale=SENSOR_COLORSCALE,
+            color=state["colors"],
+            size=state["sizes"],
+            line=dict(width=2, color="#000000"),
+            showscale=False,
+        ),
+    )
+    texts = iter(state["texts"])
+    for x, y in zip(FEET_CORD_X, FEET_CORD_Y):
+        feet.add_annotation(
+            x=x, y=y, text=next(texts), showarrow=False,
+            font=dict(FONT, color="#000000"),
+        )
+    for cord in FEET_TEXTBOXES.values():
+        feet.add_shape(
+            type="rect", x0=cord[0], y0=cord[1], x1=cord[2], y1=cord[3],
+            line_color="#636363", line_width=3,
+        )
+        for x, y in textbox_line_positions(cord):
+            feet.add_annotation(
+                x=x, y=y, text=next(texts), showarrow=False,
+                font=dict(FONT, color="#ffffff"),
+            )
+    return feet.to_plotly_json()
+
+
+def render_feet(template, state):
+    # What feet.applyState in assets/clientside.js does in the browser:
+    # only the containers that change are copied, image, axes, colorscale
+    # and fonts stay shared with the template.
+    visible = state is not None
+    markers = dict(template["data"][0], visible=visible)
+    if visible:
+        markers["marker"] = dict(
+            markers["marker"], color=state["colors"], size=state["sizes"]
+        )
+    layout = dict(template["layout"])
+    layout["shapes"] = [
+        dict(shape, visible=visible) for shape in layout["shapes"]
+    ]
+    layout["annotations"] = [
+        dict(annotation, visible=visible,
+             text=state["texts"][i] if visible else "")
+        for i, annotation in enumerate(layout["annotations"])
+    ]
+    return {"data": [markers] + template["data"][1:], "layout": layout}
+
+
+def template_path(template, sensors):
+    state = feet_state(sensors, FEET_SENSORS, FEET_TEXTBOXES, None)
+    return render_feet(template, state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=600)
+    parser.add_argument("--repeats", type=int, default=100)
+    args = parser.parse_args()
+
+    app = dash.Dash(__name__)
+    template = build_feet_template(app.get_asset_url("image.png"))
+    sensors = synthetic_window(args.rows)
+
+    print(f"{'path':>10} {'p50':>10} {'p99':>10} {'bytes':>8}")
+    for name, render in (
+        ("figure", lambda: figure_path(app, sensors)),
+        ("template", lambda: template_path(template, sensors)),
+    ):
+        payload = json.dumps(render(), cls=plotly.utils.PlotlyJSONEncoder)
+        timing = summarize(
+            [timed(render)[0] for _ in range(args.repeats)]
+        )
+        print(f"{name:>10} {timing['p50_ms']:>8.2f}ms "
+              f"{timing['p99_ms']:>8.2f}ms {len(payload):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Read and rolling-delete latency of the sensors table with and without
+indexes.
+
+    python -m benchmarks.bench_indexes --patients 6 100 1000
+"""
+import argparse
+import datetime
+import os
+import random
+
+import pandas as pd
+from sqlalchemy import text
+
+from benchmarks.common import (create_bench_engine, fill_database,
+                               summarize, temporary_database_path, timed)
+from database.db import Sensors
+
+WINDOW_ROWS = 600
+
+
+def read_patient(engine, patient_id):
+    return pd.read_sql_query(
+        Sensors.__table__.select().where(Sensors.patient_id == patient_id),
+        engine,
+        index_col="id",
+    )
+
+
+def delete_before(engine, threshold):
+    with engine.begin() as connection:
+        connection.execute(
+            Sensors.__table__.delete().where(Sensors.measured_at < threshold)
+        )
+
+
+def measure(engine, patients, oldest, reads, deletes):
+    read_samples = [
+        timed(read_patient, engine, random.randint(1, patients))[0]
+        for _ in range(reads)
+    ]
+    delete_samples = []
+    for step in range(1, deletes + 1):
+        threshold = oldest + datetime.timedelta(seconds=step)
+        delete_samples.append(timed(delete_before, engine, threshold)[0])
+    return summarize(read_samples), summarize(delete_samples)
+
+
+def drop_indexes(engine):
+    with engine.begin() as connection:
+        for index in Sensors.__table__.indexes:
+            connection.execute(text(f"DROP INDEX {index.name}"))
+
+
+def run(patients, reads, deletes):
+    path = temporary_database_path()
+    try:
+        engine = create_bench_engine(path)
+        now = datetime.datetime.now()
+        fill_database(engine, patients, WINDOW_ROWS, now=now)
+        oldest = now - datetime.timedelta(seconds=WINDOW_ROWS)
+
+        indexed = measure(engine, patients, oldest, reads, deletes)
+        drop_indexes(engine)
+        oldest += datetime.timedelta(seconds=deletes)
+        plain = measure(engine, patients, oldest, reads, deletes)
+        engine.dispose()
+    finally:
+        os.remove(path)
+    return indexed, plain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, nargs="+",
+                        default=[6, 100, 1000])
+    parser.add_argument("--reads", type=int, default=50)
+    parser.add_argument("--deletes", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'patients':>8} {'index':>6} {'read p50':>10} {'read p99':>10} "
+          f"{'delete p50':>11} {'delete p99':>11}")
+    for patients in args.patients:
+        indexed, plain = run(patients, args.reads, args.deletes)
+        for label, (read, delete) in (("yes", indexed), ("no", plain)):
+            print(f"{patients:>8} {label:>6} {read['p50_ms']:>8.2f}ms "
+                  f"{read['p99_ms']:>8.2f}ms {delete['p50_ms']:>9.2f}ms "
+                  f"{delete['p99_ms']:>9.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Callback response encoding: the figure dicts plotly hands out against
+compact_figure() with plain lists and epoch-ms dates, both encoded the way
+Dash 1 does (json with PlotlyJSONEncoder).
+
+    python -m benchmarks.bench_serialization --rows 600 36000
+"""
+import argparse
+import json
+
+import plotly
+
+from anomalies import anomaly_episodes
+from benchmarks.bench_downsampling import synthetic_window
+from benchmarks.common import summarize, timed
+from serialization import compact_figure
+from utils import (create_data_plot, update_anomalies_figure,
+                   update_history_figure)
+
+
+def dash_encode(figure):
+    return json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def figures(frame):
+    # The whole window as one trace shows the per-element cost that the
+    # downsampled History figure hides.
+    return {
+        "raw trace": {
+            "data": [
+                {
+                    "type": "scattergl",
+                    "x": frame["measured_at"].to_numpy(),
+                    "y": frame["L0_val"].to_numpy(),
+                }
+            ],
+            "layout": {},
+        },
+        "History": update_history_figure(
+            create_data_plot(), "L0", frame, None
+        ).to_dict(),
+        "Anomalies": update_anomalies_figure(
+            create_data_plot(), "L0", frame, None, anomaly_episodes(frame)
+        ).to_dict(),
+    }
+
+
+def paths():
+    return {
+        "plotly": dash_encode,
+        "compact": lambda figure: dash_encode(compact_figure(figure)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[600, 36000])
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'figure':>10} {'path':>15} {'bytes':>9} "
+          f"{'p50':>10} {'p99':>10}")
+    for rows in args.rows:
+        frame = synthetic_window(rows)
+        for name, figure in figures(frame).items():
+            for path, encode in paths().items():
+                payload = encode(figure)
+                timing = summarize(
+                    [timed(encode, figure)[0] for _ in range(args.repeats)]
+                )
+                print(f"{rows:>7} {name:>10} {path:>15} {len(payload):>9} "
+                      f"{timing['p50_ms']:>8.2f}ms "
+                      f"{timing['p99_ms']:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""End to end timings of the hot paths on a synthetic history: one
+ingestion cycle against the local monitor stand-in, the data layer reads,
+every utils figure builder and the full feet and data plot callbacks.
+Results are written as JSON; --compare prints the ratio to an earlier run.
+
+    python -m benchmarks.bench_suite --patients 50 --output results.json
+    python -m benchmarks.bench_suite --compare baseline.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUITE_SENSOR = "L0"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=1.0)
+    parser.add_argument("--seconds", type=float, default=600)
+    parser.add_argument("--anomaly-density", type=float, default=0.05)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--ingest-ticks", type=int, default=10)
+    parser.add_argument("--port", type=int, default=9083)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare")
+    return parser.parse_args()
+
+
+def measure(function, repeats, before=None):
+    # Like every import below that reaches database.db, this one waits for
+    # main() to point DATABASE_PATH at a temporary directory.
+    from benchmarks.common import summarize, timed
+
+    samples = []
+    for _ in range(repeats):
+        if before is not None:
+            before()
+        samples.append(timed(function)[0])
+    return dict(summarize(samples), repeats=repeats)
+
+
+async def ingestion_cycles(args):
+    from benchmarks.common import summarize
+    from benchmarks.mock_monitor import create_app, start_mock_monitor
+    from database.data import (create_client_session, fetch_patient_record,
+                               write_batch)
+
+    runner = await start_mock_monitor(
+        create_app(anomaly_rate=args.anomaly_density), port=args.port
+    )
+    fetches, writes, cycles = [], [], []
+    try:
+        async with create_client_session() as session:
+            for _ in range(args.ingest_ticks):
+                started = time.perf_counter()
+                records = await asyncio.gather(
+                    *[
+                        fetch_patient_record(str(patient_id), session)
+                        for patient_id in range(1, args.patients + 1)
+                    ]
+                )
+                fetched = time.perf_counter()
+                records = [record for record in records if record is not None]
+                write_batch(
+                    [patient for patient, _ in records],
+                    [sensors for _, sensors in records],
+                    delete_outdated=False,
+                )
+                written = time.perf_counter()
+                fetches.append(fetched - started)
+                writes.append(written - fetched)
+                cycles.append(written - started)
+    finally:
+        await runner.cleanup()
+    return {
+        "ingest.fetch": dict(summarize(fetches), repeats=len(fetches)),
+        "ingest.write": dict(summarize(writes), repeats=len(writes)),
+        "ingest.cycle": dict(summarize(cycles), repeats=len(cycles)),
+    }
+
+
+def data_layer(repeats, patient_id):
+    from database.cache import bump_data_version
+    from database.data import (get_all_patient_sensors, get_patient_window,
+                               get_sensor_summaries)
+
+    # A version bump is what a new tick does to every cached read.
+    def new_tick():
+        bump_data_version([patient_id])
+
+    return {
+        "data.get_all_patient_sensors": measure(
+            lambda: get_all_patient_sensors(patient_id), repeats, new_tick
+        ),
+        "data.get_patient_window": measure(
+            lambda: get_patient_window(patient_id), repeats, new_tick
+        ),
+        "data.get_sensor_summaries": measure(
+            lambda: get_sensor_summaries(patient_id), repeats, new_tick
+        ),
+    }
+
+
+def figure_builders(repeats, patient_id):
+    from anomalies import anomaly_episodes
+    from database.data import get_patient_window
+    from feet_template import FEET_SENSORS, FEET_TEXTBOXES
+    from utils import (create_data_plot, feet_state, update_anomalies_figure,
+                       update_history_figure)
+
+    sensors = get_patient_window(patient_id)
+    episodes = anomaly_episodes(sensors, FEET_SENSORS)
+    return {
+        "utils.feet_state": measure(
+            lambda: feet_state(sensors, FEET_SENSORS, FEET_TEXTBOXES, None),
+            repeats,
+        ),
+        "utils.create_data_plot": measure(create_data_plot, repeats),
+        "utils.update_history_figure": measure(
+            lambda: update_history_figure(
+                create_data_plot(), SUITE_SENSOR, sensors, None
+            ),
+            repeats,
+        ),
+        "anomalies.anomaly_episodes": measure(
+            lambda: anomaly_episodes(sensors, FEET_SENSORS), repeats
+        ),
+        "utils.update_anomalies_figure": measure(
+            lambda: update_anomalies_figure(
+                create_data_plot(), SUITE_SENSOR, sensors, None, episodes
+            ),
+            repeats,
+        ),
+    }
+
+
+def callbacks(repeats, patient_id):
+    # Importing the app switches the database to read-only connections, so
+    # this runs after the ingestion cycles.
+    import app
+    from database.cache import bump_data_version
+
+    def new_tick():
+        bump_data_version([patient_id])
+
+    # Past the Dash wrapper, which needs a request context.
+    update_feet_graph = app.update_feet_graph.__wrapped__
+    update_data_plot = app.update_data_plot.__wrapped__
+    results = {}
+    for name, call in (
+        (
+            "callback.update_feet_graph",
+            lambda: update_feet_graph(patient_id, None, None, None),
+        ),
+        (
+            "callback.update_data_plot.history",
+            lambda: update_data_plot(
+                patient_id, "History", SUITE_SENSOR, None, None
+            ),
+        ),
+        (
+            "callback.update_data_plot.anomalies",
+            lambda: update_data_plot(
+                patient_id, "Anomalies", SUITE_SENSOR, None, None
+            ),
+        ),
+    ):
+        results[f"{name}.cold"] = measure(call, repeats, new_tick)
+        results[f"{name}.warm"] = measure(call, repeats)
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"{'path':>44} {'p50':>10} {'p99':>10} {'vs base':>8}")
+    for name, timing in results.items():
+        ratio = ""
+        if baseline and name in baseline:
+            ratio = f"{timing['p50_ms'] / baseline[name]['p50_ms']:.2f}x"
+        print(f"{name:>44} {timing['p50_ms']:>8.2f}ms "
+              f"{timing['p99_ms']:>8.2f}ms {ratio:>8}")
+
+
+def main():
+    args = parse_args()
+    directory = tempfile.mkdtemp(prefix="bench-suite-")
+    # The database modules read their configuration at import time.
+    os.environ["DATABASE_PATH"] = os.path.join(directory, "history.sqlite")
+    os.environ["PATIENTS_ID_LIST"] = f"1-{args.patients}"
+    os.environ["PATIENTS_MONITOR_URL"] = (
+        f"http://127.0.0.1:{args.port}/v2/monitor/"
+    )
+    os.environ.setdefault("SNAPSHOT_CACHE_BACKEND", "memory")
+
+    from benchmarks.synthetic import fill_history
+
+    try:
+        stored = fill_history(
+            args.patients, args.seconds, args.rate, args.anomaly_density,
+            args.seed,
+        )
+        results = asyncio.run(ingestion_cycles(args))
+        results.update(data_layer(args.repeats, 1))
+        results.update(figure_builders(args.repeats, 1))
+        results.update(callbacks(args.repeats, 1))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    print_results(results, baseline)
+
+    report = {
+        "commit": current_commit(),
+        "created_at": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "config": dict(vars(args), rows=stored),
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Ward overview cost per tick: one grouped query over the rolling summaries
+of all patients against one window query plus window_stats() per patient.
+
+    python -m benchmarks.bench_ward --patients 10 50 100 200
+"""
+import argparse
+import os
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from benchmarks.bench_indexes import WINDOW_ROWS, read_patient
+from benchmarks.common import (create_bench_engine, fill_database,
+                               summarize, temporary_database_path, timed)
+from database.data import mark_ward_status, ward_overview_query
+from database.db import SensorSummary
+from database.rolling import RollingAggregates
+from stats import window_stats
+from ward import build_ward_figure
+
+
+def fill_summaries(engine, patients):
+    # What the ingester's rolling aggregates hold after a full window.
+    rows = []
+    for patient_id in patients.index:
+        window = read_patient(engine, patient_id)
+        aggregates = RollingAggregates()
+        for row in window.to_dict("records"):
+            aggregates.add(row)
+        updated_at = window["measured_at"].iloc[-1].to_pydatetime()
+        for sensor, summary in aggregates.summaries().items():
+            rows.append(
+                {
+                    "patient_id": patient_id,
+                    "sensor": sensor,
+                    "count": summary["count"],
+                    "mean_val": summary["mean"],
+                    "min_val": summary["min"],
+                    "max_val": summary["max"],
+                    "last_val": summary["last"],
+                    "anomalies": summary["anomalies"],
+                    "updated_at": updated_at,
+                }
+            )
+    with engine.begin() as connection:
+        connection.execute(SensorSummary.__table__.insert(), rows)
+
+
+def batched_tick(engine, patients):
+    with Session(bind=engine) as session:
+        statement = ward_overview_query(session).statement
+    overview = pd.read_sql_query(statement, engine, index_col="patient_id")
+    return build_ward_figure(mark_ward_status(overview), patients)
+
+
+def per_patient_tick(engine, patients):
+    return [
+        window_stats(read_patient(engine, patient_id))
+        for patient_id in patients.index
+    ]
+
+
+def run(patients, repeats):
+    path = temporary_database_path()
+    try:
+        engine = create_bench_engine(path)
+        fill_database(engine, patients, WINDOW_ROWS)
+        frame = pd.read_sql_query(
+            "SELECT * FROM patients", engine, index_col="id"
+        )
+        fill_summaries(engine, frame)
+        results = {
+            name: summarize(
+                [timed(tick, engine, frame)[0] for _ in range(repeats)]
+            )
+            for name, tick in (
+                ("batched", batched_tick),
+                ("per-patient", per_patient_tick),
+            )
+        }
+        engine.dispose()
+    finally:
+        os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, nargs="+",
+                        default=[10, 50, 100, 200])
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'patients':>8} {'path':>12} {'p50':>10} {'p99':>10} "
+          f"{'per patient':>12}")
+    for patients in args.patients:
+        for name, timing in run(patients, args.repeats).items():
+            print(f"{patients:>8} {name:>12} {timing['p50_ms']:>8.2f}ms "
+                  f"{timing['p99_ms']:>8.2f}ms "
+                  f"{timing['p50_ms'] / patients:>10.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
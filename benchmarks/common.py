@@ -0,0 +1,76 @@
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from database.db import Base, Patient, Sensors
+
+SENSOR_NAMES = ["L0", "L1", "L2", "R0", "R1", "R2"]
+
+
+def temporary_database_path(prefix="bench-"):
+    handle, path = tempfile.mkstemp(prefix=prefix, suffix=".sqlite")
+    os.close(handle)
+    return path
+
+
+def create_bench_engine(path):
+    engine = create_engine(f"sqlite+pysqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def sensors_row(patient_id, measured_at, anomaly_rate=0.05):
+    row = {"patient_id": patient_id, "measured_at": measured_at}
+    for name in SENSOR_NAMES:
+        row[f"{name}_val"] = random.randint(0, 1023)
+        row[f"{name}_anom"] = random.random() < anomaly_rate
+    return row
+
+
+def fill_database(engine, patients, rows_per_patient, period=1.0, now=None):
+    now = now or datetime.datetime.now()
+    with engine.begin() as connection:
+        connection.execute(
+            Patient.__table__.insert(),
+            [
+                {
+                    "id": patient_id,
+                    "firstname": f"Patient{patient_id}",
+                    "lastname": "Synthetic",
+                    "birthdate": 1940 + patient_id % 50,
+                    "disabled": patient_id % 3 == 0,
+                }
+                for patient_id in range(1, patients + 1)
+            ],
+        )
+        # Rows are interleaved by time, the way the ingester writes them.
+        for step in range(rows_per_patient, 0, -1):
+            measured_at = now - datetime.timedelta(seconds=step * period)
+            connection.execute(
+                Sensors.__table__.insert(),
+                [
+                    sensors_row(patient_id, measured_at)
+                    for patient_id in range(1, patients + 1)
+                ],
+            )
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    p99_index = min(len(samples) - 1, int(len(samples) * 0.99))
+    return {
+        "p50_ms": 1000 * statistics.median(samples),
+        "p99_ms": 1000 * samples[p99_index],
+        "mean_ms": 1000 * statistics.fmean(samples),
+    }
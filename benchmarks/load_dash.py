@@ -0,0 +1,134 @@
+"""Concurrent dashboard clients against a running Dash server: every client
+renders the History plot once, then each tick posts the callbacks a pushed
+update triggers, keeping its stores the way the browser does.
+
+    gunicorn --config gunicorn.conf.py wsgi:server
+    python -m benchmarks.load_dash --clients 10 50 --duration 20
+"""
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+import aiohttp
+
+from benchmarks.common import summarize
+
+TICK_CALLBACKS = ["div-for-bio", "feet-state", "data-plot.extendData"]
+
+
+def find_callback(dependencies, output):
+    for dependency in dependencies:
+        if output in dependency["output"]:
+            return dependency
+    raise KeyError(output)
+
+
+def callback_body(dependency, values, trigger):
+    def fill(items):
+        return [
+            dict(item, value=values.get((item["id"], item["property"])))
+            for item in items
+        ]
+
+    return {
+        "output": dependency["output"],
+        "inputs": fill(dependency["inputs"]),
+        "state": fill(dependency["state"]),
+        "changedPropIds": [trigger],
+    }
+
+
+class DashClient:
+    def __init__(self, url, session, dependencies, patient_id, latencies):
+        self.url = url.rstrip("/") + "/_dash-update-component"
+        self.session = session
+        self.dependencies = dependencies
+        self.latencies = latencies
+        self.values = {
+            ("patient_selector", "value"): patient_id,
+            ("plot_selector", "value"): "History",
+            ("sensors-tabs", "value"): "L0",
+            ("data-plot", "relayoutData"): {"autosize": True},
+        }
+
+    async def call(self, output, trigger):
+        dependency = find_callback(self.dependencies, output)
+        body = callback_body(dependency, self.values, trigger)
+        started = time.perf_counter()
+        async with self.session.post(self.url, json=body) as response:
+            payload = await response.read()
+            status = response.status
+        self.latencies[output].append(time.perf_counter() - started)
+        if status == 200:
+            result = json.loads(payload)
+            for component, props in result["response"].items():
+                for prop, value in props.items():
+                    self.values[(component, prop)] = value
+        elif status != 204:
+            raise RuntimeError(f"{output}: HTTP {status}")
+
+    async def run(self, duration, period):
+        await self.call("data-plot.figure", "plot_selector.value")
+        deadline = time.monotonic() + duration
+        tick = 0
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            tick += 1
+            # Stands in for the update-signal store the push stream sets.
+            self.values[("update-signal", "data")] = {"version": str(tick)}
+            for output in TICK_CALLBACKS:
+                await self.call(output, "update-signal.data")
+            await asyncio.sleep(max(0.0, period - time.monotonic() + started))
+
+
+async def run(url, clients, patients, duration, period):
+    latencies = collections.defaultdict(list)
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.get(url.rstrip("/") + "/_dash-dependencies") as r:
+            dependencies = [
+                dependency
+                for dependency in await r.json()
+                if not dependency.get("clientside_function")
+            ]
+        started = time.monotonic()
+        await asyncio.gather(
+            *[
+                DashClient(
+                    url, session, dependencies, i % patients + 1, latencies
+                ).run(duration, period)
+                for i in range(clients)
+            ]
+        )
+        elapsed = time.monotonic() - started
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--patients", type=int, default=6)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--period", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'clients':>7} {'callback':>22} {'req/s':>8} {'p50':>10} "
+          f"{'p99':>10}")
+    for clients in args.clients:
+        latencies, elapsed = asyncio.run(
+            run(args.url, clients, args.patients, args.duration, args.period)
+        )
+        latencies["all"] = [
+            sample for samples in latencies.values() for sample in samples
+        ]
+        for output, samples in latencies.items():
+            timing = summarize(samples)
+            print(f"{clients:>7} {output:>22} {len(samples) / elapsed:>8.1f} "
+                  f"{timing['p50_ms']:>8.2f}ms {timing['p99_ms']:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Sustained ingestion throughput of sharded ingester workers against the
+local monitor stand-in.
+
+    python -m benchmarks.load_ingest --patients 1000 --shards 1 2 4
+"""
+import argparse
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_monitor(port):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_monitor", "--port", str(port)],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    time.sleep(1.5)
+    return process
+
+
+def count_samples(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM sensors").fetchone()[0]
+
+
+def run(patients, shards, duration, port, concurrency):
+    directory = tempfile.mkdtemp(prefix="load-ingest-")
+    path = os.path.join(directory, "history.sqlite")
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        DATABASE_PATH=path,
+        PATIENTS_ID_LIST=f"1-{patients}",
+        PATIENTS_MONITOR_URL=f"http://127.0.0.1:{port}/v2/monitor/",
+        INGEST_SHARDS=str(shards),
+        MONITOR_CONCURRENCY=str(concurrency),
+    )
+    ingester = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "database", "data.py")],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        # Let every worker connect and finish its first discovery.
+        time.sleep(3)
+        start_count, start = count_samples(path), time.monotonic()
+        time.sleep(duration)
+        end_count, end = count_samples(path), time.monotonic()
+    finally:
+        os.killpg(ingester.pid, signal.SIGTERM)
+        ingester.wait()
+        shutil.rmtree(directory)
+    return (end_count - start_count) / (end - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=9081)
+    args = parser.parse_args()
+
+    monitor = start_monitor(args.port)
+    try:
+        print(f"{'shards':>6} {'samples/s':>10} {'per core':>10}")
+        for shards in args.shards:
+            rate = run(args.patients, shards, args.duration, args.port,
+                       args.concurrency)
+            print(f"{shards:>6} {rate:>10.1f} {rate / shards:>10.1f}")
+    finally:
+        monitor.terminate()
+        monitor.wait()
+
+
+if __name__ == "__main__":
+    main()
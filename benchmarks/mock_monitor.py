@@ -0,0 +1,104 @@
+"""Local stand-in for the patients monitor API, with optional fault
+injection.
+
+    python -m benchmarks.mock_monitor --port 9080 --failure-rate 0.1
+    PATIENTS_MONITOR_URL=http://localhost:9080/v2/monitor/ \\
+        python database/data.py
+"""
+import argparse
+import asyncio
+import random
+
+from aiohttp import web
+
+from benchmarks.common import SENSOR_NAMES
+
+DEAD_ENDPOINT_DELAY = 5.0
+FIRSTNAMES = ["Janek", "Elżbieta", "Albert", "Ewelina", "Piotr", "Bartosz"]
+LASTNAMES = ["Grzegorczyk", "Kochalska", "Lisowski", "Nosowska", "Fokalski"]
+
+
+def patient_payload(patient_id, anomaly_rate=0.05):
+    patient_random = random.Random(patient_id)
+    return {
+        "birthdate": str(patient_random.randint(1930, 1990)),
+        "disabled": patient_random.random() < 0.3,
+        "firstname": patient_random.choice(FIRSTNAMES),
+        "id": patient_id,
+        "lastname": patient_random.choice(LASTNAMES),
+        "trace": {
+            "id": random.randint(0, 10 ** 6),
+            "name": "walk",
+            "sensors": [
+                {
+                    "anomaly": random.random() < anomaly_rate,
+                    "id": index,
+                    "name": name,
+                    "value": random.randint(0, 1023),
+                }
+                for index, name in enumerate(SENSOR_NAMES)
+            ],
+        },
+    }
+
+
+def create_app(anomaly_rate=0.05, failure_rate=0.0, slow_rate=0.0,
+               slow_delay=2.0, dead_patients=(), malformed_patients=()):
+    dead_patients = {int(patient_id) for patient_id in dead_patients}
+    malformed_patients = {int(patient_id) for patient_id in malformed_patients}
+
+    async def monitor(request):
+        patient_id = int(request.match_info["patient_id"])
+        if patient_id in dead_patients:
+            # Dead endpoints hang well past any client timeout.
+            await asyncio.sleep(DEAD_ENDPOINT_DELAY)
+        if random.random() < slow_rate:
+            await asyncio.sleep(slow_delay)
+        if random.random() < failure_rate:
+            raise web.HTTPServiceUnavailable()
+        if patient_id in malformed_patients:
+            # A bio without its trace, as sent by a monitor mid-deploy.
+            payload = patient_payload(patient_id, anomaly_rate)
+            del payload["trace"]
+            return web.json_response(payload)
+        return web.json_response(patient_payload(patient_id, anomaly_rate))
+
+    app = web.Application()
+    app.router.add_get("/v2/monitor/{patient_id}", monitor)
+    return app
+
+
+async def start_mock_monitor(app, host="127.0.0.1", port=9080):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9080)
+    parser.add_argument("--anomaly-rate", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-delay", type=float, default=2.0)
+    parser.add_argument("--dead-patients", type=int, nargs="*", default=[])
+    parser.add_argument(
+        "--malformed-patients", type=int, nargs="*", default=[]
+    )
+    args = parser.parse_args()
+    app = create_app(
+        args.anomaly_rate,
+        args.failure_rate,
+        args.slow_rate,
+        args.slow_delay,
+        args.dead_patients,
+        args.malformed_patients,
+    )
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Synthetic sensor history: a walking gait per patient with anomaly
+episodes, written through the ingester's own write_batch so the rolling
+summaries, the rollups and, with SENSORS_BACKEND=ringbuffer, the ring
+buffers match what production holds.
+
+    DATABASE_PATH=/tmp/history.sqlite python -m benchmarks.synthetic \\
+        --patients 50 --rate 1 --seconds 600 --anomaly-density 0.05
+"""
+import argparse
+import datetime
+
+import numpy as np
+
+from benchmarks.common import SENSOR_NAMES
+
+# Heel strike to toe off: the back sensors load first, the front ones last,
+# and the right foot half a stride after the left.
+SENSOR_PHASES = {
+    "L2": 0.0,
+    "L1": 0.15,
+    "L0": 0.3,
+    "R2": 0.5,
+    "R1": 0.65,
+    "R0": 0.8,
+}
+STRIDE_SECONDS = 1.1
+EPISODE_SAMPLES = 8
+STORE_CHUNK_TICKS = 60
+
+
+def patient_gait(patient_id, samples, rate, anomaly_density, seed=0):
+    # One frame-shaped dict of arrays per patient: a noisy rectified sine
+    # per sensor and anomaly runs averaging EPISODE_SAMPLES samples.
+    rng = np.random.default_rng((seed, patient_id))
+    t = np.arange(samples) / rate
+    stride = STRIDE_SECONDS * rng.uniform(0.8, 1.3)
+    load = rng.uniform(500, 900)
+    columns = {}
+    for name in SENSOR_NAMES:
+        phase = 2 * np.pi * (t / stride + SENSOR_PHASES[name])
+        values = load * np.maximum(np.sin(phase), 0)
+        values += rng.normal(0, 25, samples)
+
+        starts = rng.random(samples) < anomaly_density / EPISODE_SAMPLES
+        lengths = rng.geometric(1 / EPISODE_SAMPLES, samples)
+        ends = np.minimum(np.arange(samples) + lengths, samples)
+        anomalous = np.zeros(samples + 1, dtype=np.int32)
+        np.add.at(anomalous, np.nonzero(starts)[0], 1)
+        np.add.at(anomalous, ends[starts], -1)
+        anomalous = np.cumsum(anomalous[:-1]) > 0
+        values[anomalous] += rng.uniform(200, 500, anomalous.sum())
+
+        columns[f"{name}_val"] = np.clip(values, 0, 1023).astype(int)
+        columns[f"{name}_anom"] = anomalous
+    return columns
+
+
+def synthetic_patient(patient_id):
+    return {
+        "id": patient_id,
+        "firstname": f"Patient{patient_id}",
+        "lastname": "Synthetic",
+        "birthdate": 1930 + patient_id % 60,
+        "disabled": patient_id % 3 == 0,
+    }
+
+
+def synthetic_ticks(patients, seconds, rate=1.0, anomaly_density=0.05,
+                    now=None, seed=0):
+    # Rows grouped by tick and interleaved by patient, in ingestion order.
+    now = now or datetime.datetime.now()
+    samples = int(seconds * rate)
+    gaits = {
+        patient_id: patient_gait(
+            patient_id, samples, rate, anomaly_density, seed
+        )
+        for patient_id in range(1, patients + 1)
+    }
+    for sample in range(samples):
+        measured_at = now - datetime.timedelta(
+            seconds=(samples - sample) / rate
+        )
+        yield [
+            dict(
+                {
+                    column: values[sample].item()
+                    for column, values in gait.items()
+                },
+                patient_id=patient_id,
+                measured_at=measured_at,
+            )
+            for patient_id, gait in gaits.items()
+        ]
+
+
+def fill_history(patients, seconds, rate=1.0, anomaly_density=0.05,
+                 seed=0, chunk_ticks=STORE_CHUNK_TICKS):
+    # The database modules read DATABASE_PATH at import time.
+    from database.data import write_batch
+    from database.db import init_db
+
+    init_db()
+    bios = [synthetic_patient(i) for i in range(1, patients + 1)]
+    chunk = []
+    stored = 0
+    for ticks, rows in enumerate(
+        synthetic_ticks(patients, seconds, rate, anomaly_density, seed=seed)
+    ):
+        chunk += rows
+        if (ticks + 1) % chunk_ticks == 0:
+            write_batch(bios, chunk, delete_outdated=False)
+            stored += len(chunk)
+            chunk = []
+    if chunk:
+        write_batch(bios, chunk, delete_outdated=False)
+        stored += len(chunk)
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=1.0)
+    parser.add_argument("--seconds", type=float, default=600)
+    parser.add_argument("--anomaly-density", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stored = fill_history(
+        args.patients, args.seconds, args.rate, args.anomaly_density,
+        args.seed,
+    )
+    print(f"stored {stored} rows for {args.patients} patients")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import datetime
+import logging
+import os
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+
+from database.db import (DATABASE_PATH, RETENTION_MINUTES, ArchivePartition,
+                         Sensors, database_session)
+
+logger = logging.getLogger("patients-monitor")
+
+ARCHIVE_DIRECTORY = os.environ.get(
+    "ARCHIVE_DIRECTORY",
+    os.path.join(os.path.dirname(DATABASE_PATH), "archive"),
+)
+ARCHIVE_ENABLED = os.environ.get("ARCHIVE_ENABLED", "1") == "1"
+# Expired rows are rolled into the archive once a minute instead of on
+# every tick, which keeps the number of chunks per hour small.
+ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", 60))
+# Upper bound for the rows moved by one transaction.
+ARCHIVE_BATCH_ROWS = int(os.environ.get("ARCHIVE_BATCH_ROWS", 50000))
+ARCHIVE_READ_RETRIES = 3
+
+SENSORS_COLUMNS = [
+    c for c in Sensors.__table__.columns.keys() if c != "id"
+]
+
+
+def partition_hour(measured_at):
+    return measured_at.replace(minute=0, second=0, microsecond=0)
+
+
+def _chunk_path(directory, patient_id, hour):
+    # SQLite may reuse row ids, so chunk names do not depend on them.
+    return os.path.join(
+        directory,
+        str(int(patient_id)),
+        hour.strftime("%Y%m%d%H"),
+        f"{uuid.uuid4().hex}.npz",
+    )
+
+
+def write_chunk(path, frame):
+    # One compressed array per column; timestamps as int64 nanoseconds.
+    arrays = {"id": frame.index.to_numpy(dtype=np.int64)}
+    for column in SENSORS_COLUMNS:
+        if column == "measured_at":
+            arrays[column] = (
+                frame[column].to_numpy(dtype="datetime64[ns]")
+                .astype(np.int64)
+            )
+        else:
+            arrays[column] = frame[column].to_numpy()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as chunk_file:
+        np.savez_compressed(chunk_file, **arrays)
+    os.replace(tmp_path, path)
+
+
+def read_chunk(path):
+    with np.load(path) as chunk:
+        data = {column: chunk[column] for column in SENSORS_COLUMNS}
+        index = pd.Index(chunk["id"], name="id")
+    data["measured_at"] = data["measured_at"].astype("datetime64[ns]")
+    return pd.DataFrame(data, index=index, columns=SENSORS_COLUMNS)
+
+
+def empty_frame():
+    return pd.DataFrame(
+        columns=SENSORS_COLUMNS, index=pd.Index([], name="id", dtype=int)
+    )
+
+
+def _partition_row(path, patient_id, hour, frame):
+    return {
+        "patient_id": int(patient_id),
+        "hour": hour,
+        "path": path,
+        "rows": len(frame),
+        "start_at": frame["measured_at"].min().to_pydatetime(),
+        "end_at": frame["measured_at"].max().to_pydatetime(),
+    }
+
+
+@database_session
+def _read_expired(session, threshold, limit):
+    return pd.read_sql_query(
+        session.query(Sensors)
+        .filter(Sensors.measured_at < threshold)
+        .order_by(Sensors.id)
+        .limit(limit)
+        .statement,
+        session.connection(),
+        index_col="id",
+    )
+
+
+@database_session
+def _commit_partitions(session, partitions, threshold, last_id):
+    # Ids only grow, so these are exactly the rows read for the chunks.
+    session.execute(ArchivePartition.__table__.insert(), partitions)
+    session.query(Sensors).filter(
+        Sensors.measured_at < threshold, Sensors.id <= last_id
+    ).delete(synchronize_session=False)
+    session.commit()
+
+
+def _remove_chunks(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def archive_expired(threshold, directory=ARCHIVE_DIRECTORY,
+                    batch_rows=ARCHIVE_BATCH_ROWS):
+    # Chunks are written outside of any transaction; the rows leave the
+    # hot table in the short one that commits their partitions, and a
+    # chunk without a committed partition row is never read.
+    archived = 0
+    while True:
+        expired = _read_expired(threshold, batch_rows)
+        if expired.empty:
+            return archived
+
+        partitions = []
+        hours = expired["measured_at"].dt.floor("H")
+        for (patient_id, hour), frame in expired.groupby(
+            [expired["patient_id"], hours]
+        ):
+            hour = hour.to_pydatetime()
+            path = _chunk_path(directory, patient_id, hour)
+            write_chunk(path, frame)
+            partitions.append(_partition_row(path, patient_id, hour, frame))
+        try:
+            _commit_partitions(
+                partitions, threshold, int(expired.index.max())
+            )
+        except Exception:
+            _remove_chunks([partition["path"] for partition in partitions])
+            raise
+
+        archived += len(expired)
+        if len(expired) < batch_rows:
+            return archived
+
+
+@database_session
+def _compactable_hours(session, now):
+    return (
+        session.query(ArchivePartition.patient_id, ArchivePartition.hour)
+        .filter(ArchivePartition.hour < partition_hour(now))
+        .group_by(ArchivePartition.patient_id, ArchivePartition.hour)
+        .having(func.count(ArchivePartition.id) > 1)
+        .all()
+    )
+
+
+@database_session
+def _compact_hour(session, patient_id, hour, directory):
+    partitions = (
+        session.query(ArchivePartition)
+        .filter_by(patient_id=patient_id, hour=hour)
+        .order_by(ArchivePartition.start_at)
+        .all()
+    )
+    frame = pd.concat([read_chunk(p.path) for p in partitions])
+    frame = frame.sort_values("measured_at", kind="mergesort")
+    path = _chunk_path(directory, patient_id, hour)
+    write_chunk(path, frame)
+
+    replaced = [partition.path for partition in partitions]
+    try:
+        session.query(ArchivePartition).filter(
+            ArchivePartition.id.in_([p.id for p in partitions])
+        ).delete(synchronize_session=False)
+        session.execute(
+            ArchivePartition.__table__.insert(),
+            [_partition_row(path, patient_id, hour, frame)],
+        )
+        session.commit()
+    except Exception:
+        _remove_chunks([path])
+        raise
+
+    # Only unlinked once no committed partition points at them.
+    _remove_chunks(replaced)
+
+
+def compact_archive(directory=ARCHIVE_DIRECTORY, now=None):
+    # Hours that can no longer receive rows are merged into one chunk, each
+    # in its own transaction so the write lock is only held for the swap.
+    hours = _compactable_hours(now or datetime.datetime.now())
+    for patient_id, hour in hours:
+        _compact_hour(patient_id, hour, directory)
+    return len(hours)
+
+
+def start_archiving(interval=ARCHIVE_INTERVAL, minutes=RETENTION_MINUTES,
+                    directory=ARCHIVE_DIRECTORY):
+    # Chunk files take far longer to write than a tick's rows, so the
+    # archive has its own thread rather than a place in the writer queue.
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            threshold = datetime.datetime.now() - datetime.timedelta(
+                minutes=minutes
+            )
+            try:
+                archive_expired(threshold, directory)
+                compact_archive(directory)
+            except Exception as err:
+                logger.error(f"Failed to archive expired rows: {err}")
+
+    threading.Thread(target=run, name="archiver", daemon=True).start()
+    return stopped
+
+
+def _partition_paths(session, patient_id, start, end):
+    query = session.query(ArchivePartition.path).filter(
+        ArchivePartition.patient_id == patient_id
+    )
+    if start is not None:
+        query = query.filter(ArchivePartition.end_at >= start)
+    if end is not None:
+        query = query.filter(ArchivePartition.start_at <= end)
+    return [path for path, in query.order_by(ArchivePartition.start_at)]
+
+
+@database_session
+def read_archived_sensors(session, patient_id, start=None, end=None):
+    # Partition pruning happens on the start_at / end_at metadata, so only
+    # chunks overlapping the range are decompressed.
+    for _ in range(ARCHIVE_READ_RETRIES):
+        paths = _partition_paths(session, patient_id, start, end)
+        try:
+            frames = [read_chunk(path) for path in paths]
+            break
+        except FileNotFoundError:
+            # A compaction replaced the chunks in between; re-read the
+            # partition list.
+            session.rollback()
+    else:
+        raise RuntimeError(f"archive of patient {patient_id} kept changing")
+
+    if not frames:
+        return empty_frame()
+    sensors = pd.concat(frames)
+    mask = np.ones(len(sensors), dtype=bool)
+    if start is not None:
+        mask &= (sensors["measured_at"] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (sensors["measured_at"] <= pd.Timestamp(end)).to_numpy()
+    return sensors[mask].sort_values("measured_at", kind="mergesort")
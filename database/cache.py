@@ -0,0 +1,350 @@
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from database.db import DATABASE_PATH
+
+VERSION_PATH = os.path.splitext(DATABASE_PATH)[0] + ".version"
+
+SNAPSHOT_CACHE_SIZE = 256
+SNAPSHOT_CACHE_TTL = 1.0
+# "file" adds a cache shared by all server worker processes behind the
+# in-process one.
+SNAPSHOT_CACHE_BACKEND = os.environ.get("SNAPSHOT_CACHE_BACKEND", "memory")
+SHARED_CACHE_DIRECTORY = os.environ.get(
+    "SHARED_CACHE_DIRECTORY",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        f"plotly-dash-steps-cache-{os.getuid()}",
+    ),
+)
+SHARED_CACHE_PRUNE_EVERY = 256
+
+_version_lock = threading.Lock()
+_version_files = {}
+_version_data = None
+_writer_lock = threading.Lock()
+_writer_id = 0
+_writer_versions = None
+
+
+def version_paths(version_path=VERSION_PATH):
+    # One file per ingester shard: history.version.0, history.version.1...
+    directory = os.path.dirname(version_path) or "."
+    prefix = os.path.basename(version_path) + "."
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        os.path.join(directory, name)
+        for name in names
+        if name.startswith(prefix) and name[len(prefix):].isdigit()
+    )
+
+
+def _read_version_file(path):
+    try:
+        with open(path) as version_file:
+            return json.load(version_file)
+    except (OSError, ValueError):
+        return None
+
+
+def merge_versions(files):
+    # Shards own disjoint patients; the batch is that of the latest shard.
+    merged = {"batch": None, "sensors": {}, "tables": {}}
+    for versions in files:
+        if merged["batch"] is None or versions["batch"] > merged["batch"]:
+            merged["batch"] = versions["batch"]
+        for section in ("sensors", "tables"):
+            for key, version in versions.get(section, {}).items():
+                merged[section][key] = max(
+                    version, merged[section].get(key, version)
+                )
+    return merged
+
+
+def read_versions():
+    # The ingester runs in another container, so committed versions are
+    # shared through small files next to the database. Only files whose
+    # stat changed are read again.
+    global _version_files, _version_data
+    stats = {}
+    for path in version_paths():
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stats[path] = (stat.st_mtime_ns, stat.st_size)
+    if not stats:
+        return None
+
+    with _version_lock:
+        if {path: key for path, (key, _) in _version_files.items()} != stats:
+            files = {}
+            for path, stat_key in stats.items():
+                cached = _version_files.get(path)
+                if cached is not None and cached[0] == stat_key:
+                    files[path] = cached
+                    continue
+                versions = _read_version_file(path)
+                if versions is None:
+                    return _version_data
+                files[path] = (stat_key, versions)
+            _version_files = files
+            _version_data = merge_versions(
+                [versions for _, versions in files.values()]
+            )
+        return _version_data
+
+
+def read_data_version():
+    versions = read_versions()
+    return versions["batch"] if versions is not None else None
+
+
+def read_patient_version(patient_id):
+    versions = read_versions()
+    if versions is None:
+        return None
+    return versions.get("sensors", {}).get(str(patient_id))
+
+
+def read_table_version(table):
+    versions = read_versions()
+    if versions is None:
+        return None
+    return versions.get("tables", {}).get(table)
+
+
+def set_version_writer(writer_id):
+    # Each ingester shard writes its own version file.
+    global _writer_id, _writer_versions
+    with _writer_lock:
+        _writer_id = int(writer_id)
+        _writer_versions = None
+
+
+def bump_data_version(patient_ids=(), tables=()):
+    # A shard only rewrites its own file, so there is no lock shared with
+    # the other shards; readers merge all files.
+    global _writer_versions
+    batch = time.time_ns()
+    path = f"{VERSION_PATH}.{_writer_id}"
+    with _writer_lock:
+        if _writer_versions is None:
+            # A restarted shard keeps the versions of its earlier run.
+            _writer_versions = _read_version_file(path) or {}
+        versions = _writer_versions
+        sensors = versions.setdefault("sensors", {})
+        for patient_id in patient_ids:
+            sensors[str(patient_id)] = batch
+        table_versions = versions.setdefault("tables", {})
+        for table in tables:
+            table_versions[table] = batch
+        versions["batch"] = batch
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as version_file:
+            json.dump(versions, version_file)
+        os.replace(tmp_path, path)
+    return batch
+
+
+def private_directory(directory):
+    # Entries are unpickled, so only a directory this user owns and nobody
+    # else can write to is trusted; makedirs ignores the mode of an
+    # existing one.
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or stat.S_IMODE(info.st_mode) & 0o077
+    ):
+        raise PermissionError(
+            f"{directory} is not a directory private to uid {os.getuid()}"
+        )
+    return directory
+
+
+@contextmanager
+def locked_file(path, flags=fcntl.LOCK_EX):
+    # prune() may unlink an idle lock file, so a lock only counts once the
+    # path still names the file that was locked.
+    while True:
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file, flags)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            locked = os.fstat(lock_file.fileno())
+            if current is not None and current.st_ino == locked.st_ino:
+                yield lock_file
+                return
+        finally:
+            lock_file.close()
+
+
+class FileCache:
+    # One pickle per key. Entries are written atomically and loads of a
+    # key are serialised across processes with a lock file.
+
+    def __init__(self, directory=SHARED_CACHE_DIRECTORY,
+                 ttl=SNAPSHOT_CACHE_TTL):
+        self.directory = private_directory(directory)
+        self.ttl = ttl
+        self._stores = 0
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def _read(self, path, version):
+        try:
+            with open(path, "rb") as entry_file:
+                entry_version, expires_at, value = pickle.load(entry_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if entry_version != version or expires_at <= time.time():
+            return None
+        return (value,)
+
+    def get_or_load(self, key, version, loader):
+        path = self._path(key)
+        entry = self._read(path, version)
+        if entry is not None:
+            return entry[0]
+
+        with locked_file(f"{path}.lock") as lock_file:
+            os.utime(lock_file.fileno())
+            entry = self._read(path, version)
+            if entry is not None:
+                return entry[0]
+
+            value = loader()
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as entry_file:
+                pickle.dump(
+                    (version, time.time() + self.ttl, value),
+                    entry_file,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, path)
+
+        self._stores += 1
+        if self._stores % SHARED_CACHE_PRUNE_EVERY == 0:
+            self.prune()
+        return value
+
+    def prune(self, max_age=60.0):
+        # Keys include zoom ranges, so stale entries are removed by age.
+        threshold = time.time() - max(max_age, self.ttl)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime >= threshold:
+                    continue
+                if not name.endswith(".lock"):
+                    os.remove(path)
+                    continue
+                # Lock files only go while nobody holds them; waiters see
+                # the unlink and lock the new file.
+                with locked_file(path, fcntl.LOCK_EX | fcntl.LOCK_NB):
+                    os.remove(path)
+            except (FileNotFoundError, BlockingIOError):
+                pass
+
+
+class SnapshotCache:
+    def __init__(self, maxsize=SNAPSHOT_CACHE_SIZE, ttl=SNAPSHOT_CACHE_TTL,
+                 backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key, version, now):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version or entry[1] <= now:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def get_or_load(self, key, version, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(key, version, now)
+            if entry is not None:
+                return entry[2]
+            # A lock per key and the number of callers holding or waiting
+            # for it; the last one out removes it.
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = [threading.Lock(), 0]
+            loading[1] += 1
+
+        # Concurrent callbacks of one tick wait for a single load of the key.
+        try:
+            with loading[0]:
+                with self._lock:
+                    entry = self._lookup(key, version, time.monotonic())
+                    if entry is not None:
+                        return entry[2]
+                    self.misses += 1
+
+                if self.backend is not None:
+                    value = self.backend.get_or_load(key, version, loader)
+                else:
+                    value = loader()
+
+                with self._lock:
+                    expires_at = time.monotonic() + self.ttl
+                    self._entries[key] = (version, expires_at, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                loading[1] -= 1
+                if not loading[1]:
+                    del self._loading[key]
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+def create_snapshot_cache(maxsize=SNAPSHOT_CACHE_SIZE, ttl=SNAPSHOT_CACHE_TTL,
+                          backend=SNAPSHOT_CACHE_BACKEND):
+    shared = FileCache(ttl=ttl) if backend == "file" else None
+    return SnapshotCache(maxsize, ttl, backend=shared)
@@ -1,29 +1,245 @@
 import asyncio
+import concurrent.futures
 import datetime
+import functools
 import logging
+import multiprocessing
+import os
 import sys
-from time import sleep
+import time
 
 import aiohttp
+import numpy as np
 import pandas as pd
-from requests.exceptions import HTTPError
-
-from database.db import Patient, Sensors, database_session, db_session, init_db
+from sqlalchemy import case, func, select
+
+from database.archive import (ARCHIVE_ENABLED, read_archived_sensors,
+                              start_archiving)
+from database.cache import (bump_data_version, create_snapshot_cache,
+                            read_data_version, read_patient_version,
+                            read_table_version, set_version_writer)
+from database.db import (RETENTION_MINUTES, Patient, SensorRollup, Sensors,
+                         SensorSummary, database_session, db_session, engine,
+                         init_db)
+from database.metrics import REGISTRY
+from database.patients import (configured_patient_ids, discover_patient_ids,
+                               shard_patient_ids)
+from database.resilience import CircuitBreaker, retry_async
+from database.ringbuffer import RingBufferStore, SnapshotBusy
+from database.rolling import SENSOR_NAMES, RollingAggregates
+from database.rollups import (ROLLUP_RESOLUTIONS, ROLLUP_RETENTION,
+                              PatientRollups, bucket_start)
+from database.scheduler import BatchWriter, FixedRateScheduler
+from database.window import WindowRegistry
 
 logger = logging.getLogger("patients-monitor")
 logging.basicConfig(
     stream=sys.stdout, level=logging.INFO, format="%(name)s - %(message)s"
 )
 
-PATIENTS_MONITOR_URL = "http://tesla.iem.pw.edu.pl:9080/v2/monitor/"
-PATIENTS_ID_LIST = [
-    "1", "2", "3",
-    "4", "5", "6",
-]
+PATIENTS_MONITOR_URL = os.environ.get(
+    "PATIENTS_MONITOR_URL", "http://tesla.iem.pw.edu.pl:9080/v2/monitor/"
+)
+MONITOR_CONNECTION_LIMIT = int(os.environ.get("MONITOR_CONNECTION_LIMIT", 100))
+MONITOR_KEEPALIVE_TIMEOUT = float(
+    os.environ.get("MONITOR_KEEPALIVE_TIMEOUT", 30)
+)
+MONITOR_REQUEST_TIMEOUT = float(os.environ.get("MONITOR_REQUEST_TIMEOUT", 0.3))
+# Upper bound for all retries of one patient, kept below the sample period.
+MONITOR_PATIENT_TIMEOUT = float(os.environ.get("MONITOR_PATIENT_TIMEOUT", 0.8))
+MONITOR_CONCURRENCY = int(os.environ.get("MONITOR_CONCURRENCY", 64))
+PATIENTS_ID_LIST = configured_patient_ids()
+INGEST_SHARDS = int(os.environ.get("INGEST_SHARDS", 1))
+SAMPLE_PERIOD = 1.0
+# Ward tiles of patients without a sample for this long are marked stale.
+WARD_STALE_SECONDS = 10
+# Archive reads are cached per whole bucket of this many seconds, and
+# thinned to at most HISTORY_MAX_ROWS rows first.
+HISTORY_BUCKET_SECONDS = 60
+HISTORY_MAX_ROWS = 20000
+METRICS_LOG_TICKS = 60
+DISCOVERY_TICKS = 60
+# "ringbuffer" additionally keeps the live window in memory-mapped ring
+# buffers shared with the dashboard; SQLite stays the durable store.
+SENSORS_BACKEND = os.environ.get("SENSORS_BACKEND", "sqlite")
+
+snapshot_cache = create_snapshot_cache()
+ring_store = (
+    RingBufferStore(
+        backfill=lambda patient_id, last_id: get_patient_sensors_since(
+            patient_id, last_id
+        )
+    )
+    if SENSORS_BACKEND == "ringbuffer"
+    else None
+)
+breaker = CircuitBreaker()
+fetch_attempts = REGISTRY.counter(
+    "monitor_fetches_total", "Patient fetches attempted."
+)
+fetch_retries = REGISTRY.counter(
+    "monitor_retries_total", "Monitor requests retried after an error."
+)
+fetch_failures = REGISTRY.counter(
+    "monitor_failures_total", "Patient fetches that failed after retries."
+)
+breaker_skips = REGISTRY.counter(
+    "monitor_breaker_skips_total", "Fetches skipped by an open breaker."
+)
+tick_fetch_latency = REGISTRY.gauge(
+    "ingest_tick_fetch_seconds", "Time until all fetches of a tick finished."
+)
+tick_failure_ratio = REGISTRY.gauge(
+    "ingest_tick_failure_ratio", "Share of patients missing from a tick."
+)
+ring_fallbacks = REGISTRY.counter(
+    "ring_snapshot_fallbacks_total",
+    "Sensor windows read from SQLite because the ring stayed busy.",
+)
+_patient_hashes = {}
+_rolling_aggregates = {}
+_patient_rollups = {}
+sensors_windows = WindowRegistry(
+    lambda patient_id, last_id: get_patient_sensors_since(patient_id, last_id)
+)
+
+
+def get_patients_version():
+    return read_table_version("patients")
+
+
+def get_patient_version(patient_id):
+    return read_patient_version(patient_id)
+
+
+def get_patients_df():
+    return snapshot_cache.get_or_load(
+        "patients", get_patients_version(), _read_patients_df
+    )
+
+
+def _read_ring_sensors(patient_id):
+    try:
+        sensors = ring_store.patient_frame(patient_id)
+    except SnapshotBusy:
+        # The writer kept the ring busy through every retry.
+        ring_fallbacks.inc()
+        sensors = None
+    # Until the ingester appends to the patient's ring, SQLite holds the
+    # window; both number the rows with the same ids.
+    if sensors is None:
+        return _read_all_patient_sensors(patient_id)
+    return sensors
+
+
+def get_all_patient_sensors(patient_id):
+    if ring_store is not None:
+        loader = functools.partial(_read_ring_sensors, patient_id)
+    else:
+        loader = functools.partial(_read_all_patient_sensors, patient_id)
+    return snapshot_cache.get_or_load(
+        ("sensors", patient_id), get_patient_version(patient_id), loader
+    )
+
+
+def get_patient_window(patient_id):
+    if ring_store is not None:
+        return get_all_patient_sensors(patient_id)
+    return sensors_windows.get(patient_id, get_patient_version(patient_id))
+
+
+def thin_sensors(sensors, max_rows=HISTORY_MAX_ROWS):
+    # One row per time bucket, holding the largest value and any anomaly
+    # of each sensor so peaks and episodes survive; the newest id of the
+    # bucket keeps the data plot's incremental updates in line.
+    if len(sensors) <= max_rows:
+        return sensors
+    timestamps = sensors["measured_at"].to_numpy(dtype="datetime64[ns]")
+    offsets = (timestamps - timestamps[0]).astype(np.float64)
+    buckets = np.minimum(
+        (offsets / max(offsets[-1], 1) * max_rows).astype(np.int64),
+        max_rows - 1,
+    )
+    aggregations = {"id": "max", "patient_id": "first", "measured_at": "first"}
+    for name in SENSOR_NAMES:
+        aggregations[f"{name}_val"] = "max"
+        aggregations[f"{name}_anom"] = "max"
+    thinned = (
+        sensors.assign(id=sensors.index.to_numpy())
+        .groupby(buckets)
+        .agg(aggregations)
+        .set_index("id")
+    )
+    return thinned[sensors.columns]
+
+
+def history_bounds(start, end, bucket_seconds=HISTORY_BUCKET_SECONDS):
+    # Nearby zoom ranges share one cached read of whole buckets.
+    bucket = pd.Timedelta(seconds=bucket_seconds)
+    return (
+        pd.Timestamp(start).floor(bucket).to_pydatetime(),
+        pd.Timestamp(end).ceil(bucket).to_pydatetime(),
+    )
+
+
+def get_patient_history(patient_id, start, end):
+    # Archived chunks plus whatever the hot table still holds for the range;
+    # rows leave the hot table in the transaction that archives them. Both
+    # are ordered by measured_at rather than by id.
+    bucket_start, bucket_end = history_bounds(start, end)
+
+    def load():
+        archived = read_archived_sensors(patient_id, bucket_start, bucket_end)
+        recent = _read_patient_sensors_between(
+            patient_id, bucket_start, bucket_end
+        )
+        sensors = archived if recent.empty else recent
+        if not archived.empty and not recent.empty:
+            sensors = pd.concat([archived, recent])
+        sensors = sensors.sort_values("measured_at", kind="mergesort")
+        return thin_sensors(sensors)
+
+    sensors = snapshot_cache.get_or_load(
+        ("history", patient_id, bucket_start, bucket_end),
+        get_patient_version(patient_id),
+        load,
+    )
+    measured_at = sensors["measured_at"]
+    return sensors[(measured_at >= start) & (measured_at <= end)]
+
+
+def get_sensor_rollups(patient_id, sensor, resolution, start, end):
+    return snapshot_cache.get_or_load(
+        ("rollups", patient_id, sensor, resolution, start, end),
+        get_patient_version(patient_id),
+        lambda: _read_sensor_rollups(
+            patient_id, sensor, resolution, start, end
+        ),
+    )
+
+
+def get_ward_version():
+    # Every patient changes every tick, so this follows the batch version;
+    # the time slot lets tiles turn stale when no batch comes at all.
+    return read_data_version(), int(time.time() // WARD_STALE_SECONDS)
+
+
+def get_ward_overview():
+    return snapshot_cache.get_or_load(
+        "ward", get_ward_version(), _read_ward_overview
+    )
+
+
+def get_sensor_summaries(patient_id):
+    return snapshot_cache.get_or_load(
+        ("summaries", patient_id),
+        get_patient_version(patient_id),
+        lambda: _read_sensor_summaries(patient_id),
+    )
 
 
 @database_session
-def get_patients_df(session):
+def _read_patients_df(session):
     patients = pd.read_sql_query(
         session.query(Patient)
         .with_entities(
@@ -41,7 +257,7 @@ def get_patients_df(session):
 
 
 @database_session
-def get_all_patient_sensors(session, patient_id):
+def _read_all_patient_sensors(session, patient_id):
     sensors = pd.read_sql_query(
         session.query(Sensors).filter_by(patient_id=patient_id).statement,
         db_session.bind,
@@ -50,6 +266,161 @@ def get_all_patient_sensors(session, patient_id):
     return sensors
 
 
+@database_session
+def _read_patient_sensors_between(session, patient_id, start, end):
+    sensors = pd.read_sql_query(
+        session.query(Sensors)
+        .filter(
+            Sensors.patient_id == patient_id,
+            Sensors.measured_at >= start,
+            Sensors.measured_at <= end,
+        )
+        .order_by(Sensors.id)
+        .statement,
+        db_session.bind,
+        index_col="id",
+    )
+    return sensors
+
+
+@database_session
+def _read_sensor_rollups(session, patient_id, sensor, resolution, start, end):
+    rollups = pd.read_sql_query(
+        session.query(SensorRollup)
+        .with_entities(
+            SensorRollup.bucket_start,
+            SensorRollup.count,
+            SensorRollup.sum_val,
+            SensorRollup.min_val,
+            SensorRollup.max_val,
+            SensorRollup.anomalies,
+        )
+        .filter(
+            SensorRollup.patient_id == patient_id,
+            SensorRollup.resolution == resolution,
+            SensorRollup.sensor == sensor,
+            SensorRollup.bucket_start >= bucket_start(start, resolution),
+            SensorRollup.bucket_start <= end,
+        )
+        .order_by(SensorRollup.bucket_start)
+        .statement,
+        db_session.bind,
+        parse_dates=["bucket_start"],
+    )
+    # Same column names as the raw rows, so the figures can plot either.
+    return pd.DataFrame(
+        {
+            "measured_at": rollups["bucket_start"],
+            f"{sensor}_val": rollups["sum_val"] / rollups["count"],
+            f"{sensor}_min": rollups["min_val"],
+            f"{sensor}_max": rollups["max_val"],
+            f"{sensor}_anom": rollups["anomalies"],
+        }
+    )
+
+
+def ward_overview_query(session):
+    # The rolling summaries of all patients pivoted in one grouped pass and
+    # joined with each patient's latest row, which was written together
+    # with its summaries; the cost follows the patient count, not the rows.
+    # Both joins are outer ones from the patient list, so patients without
+    # summaries or without their latest row are still listed.
+    columns = [
+        SensorSummary.patient_id,
+        func.max(SensorSummary.count).label("count"),
+        func.max(SensorSummary.updated_at).label("updated_at"),
+    ]
+    for name in SENSOR_NAMES:
+        for column, label in (
+            (SensorSummary.mean_val, "mean"),
+            (SensorSummary.min_val, "min"),
+            (SensorSummary.max_val, "max"),
+            (SensorSummary.anomalies, "anomalies"),
+        ):
+            columns.append(
+                func.max(case((SensorSummary.sensor == name, column))).label(
+                    f"{name}_{label}"
+                )
+            )
+    stats = (
+        session.query(*columns)
+        .group_by(SensorSummary.patient_id)
+        .subquery()
+    )
+
+    columns = [Patient.id.label("patient_id")]
+    columns += [column for column in stats.c if column.name != "patient_id"]
+    columns.append(Sensors.id.label("last_id"))
+    for name in SENSOR_NAMES:
+        columns += [
+            getattr(Sensors, f"{name}_val"),
+            getattr(Sensors, f"{name}_anom"),
+        ]
+    return (
+        session.query(*columns)
+        .outerjoin(stats, stats.c.patient_id == Patient.id)
+        .outerjoin(
+            Sensors,
+            (Sensors.patient_id == Patient.id)
+            & (Sensors.measured_at == stats.c.updated_at),
+        )
+        .order_by(Patient.id)
+    )
+
+
+def mark_ward_status(overview, now=None, stale_seconds=WARD_STALE_SECONDS):
+    # "offline" without a latest row, "stale" when it is too old to pass
+    # for the current reading.
+    now = now or datetime.datetime.now()
+    updated_at = pd.to_datetime(overview["updated_at"])
+    stale = updated_at < now - datetime.timedelta(seconds=stale_seconds)
+    overview["status"] = "live"
+    overview.loc[stale, "status"] = "stale"
+    overview.loc[overview["last_id"].isna(), "status"] = "offline"
+    return overview
+
+
+@database_session
+def _read_ward_overview(session):
+    overview = pd.read_sql_query(
+        ward_overview_query(session).statement,
+        db_session.bind,
+        index_col="patient_id",
+    )
+    return mark_ward_status(overview)
+
+
+@database_session
+def _read_sensor_summaries(session, patient_id, minutes=RETENTION_MINUTES):
+    # Stale summaries may outlive the retention window until the next
+    # delete pass, so they are filtered here as well.
+    threshold = datetime.datetime.now() - datetime.timedelta(minutes=minutes)
+    summaries = pd.read_sql_query(
+        session.query(SensorSummary)
+        .filter(
+            SensorSummary.patient_id == patient_id,
+            SensorSummary.updated_at >= threshold,
+        )
+        .statement,
+        db_session.bind,
+        index_col="sensor",
+    )
+    return summaries
+
+
+@database_session
+def get_patient_sensors_since(session, patient_id, last_id=0):
+    sensors = pd.read_sql_query(
+        session.query(Sensors)
+        .filter(Sensors.patient_id == patient_id, Sensors.id > last_id)
+        .order_by(Sensors.id)
+        .statement,
+        db_session.bind,
+        index_col="id",
+    )
+    return sensors
+
+
 @database_session
 def get_patient_sensors(session, patient_id):
     sensors = (
@@ -62,102 +433,357 @@ def get_patient_sensors(session, patient_id):
     return sensors
 
 
-def create_patient_object(response, patient_id):
+def create_patient_row(response, patient_id):
     response["id"] = patient_id  # Fixing patient id
 
     patient = {}
     columns = Patient.metadata.tables["patients"].columns.keys()
     for c in columns:
         patient[c] = response[c]
-
-    new_patient = Patient(**patient)
-    return new_patient
+    return patient
 
 
-def create_sensors_object(response, patient_id):
+def create_sensors_row(response, patient_id, measured_at):
     sensors = {}
     sensors["patient_id"] = patient_id
+    sensors["measured_at"] = measured_at
     sensors_list = response["trace"]["sensors"]
     for sensor in sensors_list:
         sensors[f"{sensor['name']}_val"] = sensor["value"]
         sensors[f"{sensor['name']}_anom"] = sensor["anomaly"]
-
-    new_sensors = Sensors(**sensors)
-    return new_sensors
+    return sensors
 
 
-@database_session
-def drop_outdated(session, minutes=10):
+def _delete_outdated(session, minutes=RETENTION_MINUTES):
     datetime_threshold = datetime.datetime.now() - datetime.timedelta(
         minutes=minutes
     )
-    session.query(Sensors).filter(
-        Sensors.measured_at < datetime_threshold
-    ).delete()
+    # With the archive, expired rows are left to the archiver thread.
+    if not ARCHIVE_ENABLED:
+        session.query(Sensors).filter(
+            Sensors.measured_at < datetime_threshold
+        ).delete(synchronize_session=False)
+    # Summaries are only refreshed by new rows, so a patient that stopped
+    # reporting would keep describing rows that left the window.
+    session.query(SensorSummary).filter(
+        SensorSummary.updated_at < datetime_threshold
+    ).delete(synchronize_session=False)
+
+    now = datetime.datetime.now()
+    for resolution, retention in ROLLUP_RETENTION.items():
+        session.query(SensorRollup).filter(
+            SensorRollup.resolution == resolution,
+            SensorRollup.bucket_start < now - retention,
+        ).delete(synchronize_session=False)
+
+
+@database_session
+def drop_outdated(session, minutes=RETENTION_MINUTES):
+    _delete_outdated(session, minutes)
     session.commit()
 
 
+def changed_patients(patients):
+    return [
+        patient
+        for patient in patients
+        if _patient_hashes.get(patient["id"]) != hash(tuple(patient.items()))
+    ]
+
+
+def _seed_rolling_aggregates(session, patient_id):
+    # After a restart the retention window is still in SQLite, so the
+    # aggregates start from it instead of from an empty window.
+    aggregates = RollingAggregates()
+    columns = Sensors.__table__.columns.keys()
+    for sensors in (
+        session.query(Sensors)
+        .filter(Sensors.patient_id == patient_id)
+        .order_by(Sensors.id)
+    ):
+        aggregates.add({c: getattr(sensors, c) for c in columns})
+    return aggregates
+
+
+def update_rolling_aggregates(session, sensors, threshold):
+    # A summary is stamped with the sample it ends on, which is how the
+    # ward overview finds that patient's latest row.
+    summaries = []
+    for row in sensors:
+        patient_id = int(row["patient_id"])
+        aggregates = _rolling_aggregates.get(patient_id)
+        if aggregates is None:
+            aggregates = _seed_rolling_aggregates(session, patient_id)
+            _rolling_aggregates[patient_id] = aggregates
+        aggregates.add(row)
+        aggregates.evict(threshold)
+
+        for sensor, summary in aggregates.summaries().items():
+            if summary is None:
+                continue
+            summaries.append(
+                {
+                    "patient_id": patient_id,
+                    "sensor": sensor,
+                    "count": summary["count"],
+                    "mean_val": summary["mean"],
+                    "min_val": summary["min"],
+                    "max_val": summary["max"],
+                    "last_val": summary["last"],
+                    "anomalies": summary["anomalies"],
+                    "updated_at": row["measured_at"],
+                }
+            )
+    return summaries
+
+
+def _seed_rollups(session, patient_id, measured_at):
+    # Open buckets are rebuilt from the hot table after a restart; the
+    # longest bucket still fits in the retention window.
+    rollups = PatientRollups(patient_id)
+    closed = []
+    columns = Sensors.__table__.columns.keys()
+    for sensors in (
+        session.query(Sensors)
+        .filter(
+            Sensors.patient_id == patient_id,
+            Sensors.measured_at
+            >= bucket_start(measured_at, max(ROLLUP_RESOLUTIONS)),
+        )
+        .order_by(Sensors.id)
+    ):
+        closed += rollups.add({c: getattr(sensors, c) for c in columns})
+    return rollups, closed
+
+
+def update_rollups(session, sensors):
+    # Works on copies: a closed bucket only leaves memory once its rollup
+    # rows are committed, so the caller keeps the returned state after that.
+    rows = []
+    updated = {}
+    for row in sensors:
+        patient_id = int(row["patient_id"])
+        rollups = updated.get(patient_id)
+        if rollups is None and patient_id in _patient_rollups:
+            rollups = _patient_rollups[patient_id].copy()
+        elif rollups is None:
+            rollups, closed = _seed_rollups(
+                session, patient_id, row["measured_at"]
+            )
+            rows += closed
+        updated[patient_id] = rollups
+        rows += rollups.add(row)
+    return rows, updated
+
+
+@database_session
+def store_batch(session, patients, sensors, minutes=RETENTION_MINUTES,
+                delete_outdated=True):
+    # Patient bios rarely change, so only rows whose content differs from
+    # the last stored version are rewritten (the primary key REPLACEs).
+    # Rows carry the time they were fetched; a batch may wait in the
+    # writer queue for a while before it gets here.
+    patients = changed_patients(patients)
+    summaries = update_rolling_aggregates(
+        session,
+        sensors,
+        datetime.datetime.now() - datetime.timedelta(minutes=minutes),
+    )
+    rollups, patient_rollups = update_rollups(session, sensors)
+
+    try:
+        if delete_outdated:
+            _delete_outdated(session, minutes)
+        if patients:
+            session.execute(Patient.__table__.insert(), patients)
+        if sensors:
+            session.execute(Sensors.__table__.insert(), sensors)
+            # A batch is inserted in one transaction, so its AUTOINCREMENT
+            # ids are consecutive; the ring buffers reuse them.
+            last_id = session.execute(
+                select(func.last_insert_rowid())
+            ).scalar()
+            for row_id, row in zip(
+                range(last_id - len(sensors) + 1, last_id + 1), sensors
+            ):
+                row["id"] = row_id
+        if summaries:
+            session.execute(SensorSummary.__table__.insert(), summaries)
+        if rollups:
+            session.execute(SensorRollup.__table__.insert(), rollups)
+        session.commit()
+    except Exception:
+        # The aggregates already hold rows that were never stored; the next
+        # batch of these patients seeds them again from the hot table.
+        for row in sensors:
+            _rolling_aggregates.pop(int(row["patient_id"]), None)
+        raise
+
+    _patient_rollups.update(patient_rollups)
+    for patient in patients:
+        _patient_hashes[patient["id"]] = hash(tuple(patient.items()))
+    return patients
+
+
+def create_client_session(
+    limit=MONITOR_CONNECTION_LIMIT,
+    keepalive_timeout=MONITOR_KEEPALIVE_TIMEOUT,
+    timeout=MONITOR_REQUEST_TIMEOUT,
+):
+    connector = aiohttp.TCPConnector(
+        limit=limit, keepalive_timeout=keepalive_timeout
+    )
+    return aiohttp.ClientSession(
+        connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)
+    )
+
+
 async def get_patient_data_async(patient_id, session):
     url = PATIENTS_MONITOR_URL + patient_id
-    try:
-        response = await session.request(method="GET", url=url)
-    except HTTPError as http_err:
-        logger.error(f"HTTP error occurred: {http_err}")
-    except Exception as err:
-        logger.error(f"An error ocurred: {err}")
-    response_json = await response.json()
-    return response_json
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return await response.json()
 
 
-async def fetch_patient_data(patient_id, session):
+async def fetch_patient_record(patient_id, session, measured_at=None):
+    if not breaker.allow(patient_id):
+        breaker_skips.inc()
+        return None
+
+    fetch_attempts.inc()
+    # One response feeds both tables, so bio and trace come from one moment.
     try:
-        response = await get_patient_data_async(patient_id, session)
+        response = await asyncio.wait_for(
+            retry_async(
+                lambda: get_patient_data_async(patient_id, session),
+                retry_on=(aiohttp.ClientError, asyncio.TimeoutError),
+                on_retry=fetch_retries.inc,
+            ),
+            MONITOR_PATIENT_TIMEOUT,
+        )
+        patient = create_patient_row(response, patient_id)
+        # Stamped when the reading arrives unless the tick sets the time,
+        # never when its batch commits.
+        sensors = create_sensors_row(
+            response, patient_id, measured_at or datetime.datetime.now()
+        )
     except Exception as err:
-        logger.error(f"Exception occured: {err}")
-        pass
-    patient = create_patient_object(response, patient_id)
-    return patient
+        fetch_failures.inc()
+        if breaker.record_failure(patient_id):
+            logger.warning(
+                f"Patient {patient_id} failed {breaker.failure_threshold} "
+                f"times, skipping for {breaker.cooldown}s: {err!r}"
+            )
+        return None
 
+    breaker.record_success(patient_id)
+    return patient, sensors
 
-async def fetch_sensors_data(patient_id, session):
-    try:
-        response = await get_patient_data_async(patient_id, session)
-    except Exception as err:
-        logger.error(f"Exception occured: {err}")
-        pass
-    sensors = create_sensors_object(response, patient_id)
-    return sensors
 
+def write_batch(patients, sensors, delete_outdated=True):
+    changed = store_batch(patients, sensors, delete_outdated=delete_outdated)
+    if ring_store is not None:
+        ring_store.append_rows(sensors)
+    # The patients version only moves when a bio actually changed.
+    bump_data_version(
+        [row["patient_id"] for row in sensors],
+        ["patients"] if changed else [],
+    )
 
-async def store_all_patients_data():
-    async with aiohttp.ClientSession() as session:
-        while True:
-            drop_outdated()
 
-            patients = await asyncio.gather(
-                *[
-                    fetch_patient_data(patient_id, session)
-                    for patient_id in PATIENTS_ID_LIST
-                ]
+async def store_all_patients_data(shard=0, shards=1):
+    loop = asyncio.get_running_loop()
+    scheduler = FixedRateScheduler(SAMPLE_PERIOD)
+    # The rolling delete covers every patient, so one shard is enough.
+    writer = BatchWriter(
+        functools.partial(write_batch, delete_outdated=shard == 0)
+    )
+    writer_task = asyncio.ensure_future(writer.run())
+    # Discovery reads SQLite too, but must not wait behind queued writes.
+    discovery_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="discovery"
+    )
+    semaphore = asyncio.Semaphore(MONITOR_CONCURRENCY)
+    patient_ids = []
+    # The scheduler's tick counter is process wide and carries on from an
+    # earlier run, so discovery counts the ticks of this run.
+    run_ticks = 0
+    archiver = start_archiving() if ARCHIVE_ENABLED and shard == 0 else None
+
+    async with create_client_session() as session:
+
+        async def fetch(patient_id, measured_at):
+            async with semaphore:
+                return await fetch_patient_record(
+                    patient_id, session, measured_at
+                )
+
+        async def tick():
+            nonlocal patient_ids, run_ticks
+            if run_ticks % DISCOVERY_TICKS == 0:
+                discovered = await loop.run_in_executor(
+                    discovery_executor, discover_patient_ids
+                )
+                patient_ids = shard_patient_ids(discovered, shard, shards)
+            run_ticks += 1
+
+            # Every row of a tick is stamped with the tick's start, however
+            # long its fetch or its place in the writer queue takes.
+            measured_at = datetime.datetime.now()
+            started_at = loop.time()
+            records = await asyncio.gather(
+                *[fetch(patient_id, measured_at) for patient_id in patient_ids]
             )
-            sensors = await asyncio.gather(
-                *[
-                    fetch_sensors_data(patient_id, session)
-                    for patient_id in PATIENTS_ID_LIST
-                ]
+            records = [record for record in records if record is not None]
+            tick_fetch_latency.set(loop.time() - started_at)
+            if patient_ids:
+                tick_failure_ratio.set(1 - len(records) / len(patient_ids))
+            writer.submit(
+                [patient for patient, _ in records],
+                [sensors for _, sensors in records],
             )
 
-            database_session = db_session()
-            database_session.add_all(patients)
-            database_session.add_all(sensors)
-            database_session.commit()
-            db_session.remove()
-            sleep(0.9)
+            if run_ticks % METRICS_LOG_TICKS == 0:
+                logger.info(
+                    f"Shard {shard}/{shards} monitoring {len(patient_ids)} "
+                    f"patients: {REGISTRY.snapshot()}"
+                )
 
+        try:
+            await scheduler.run(tick)
+        finally:
+            writer_task.cancel()
+            discovery_executor.shutdown(wait=False)
+            if archiver is not None:
+                archiver.set()
 
-if __name__ == "__main__":
-    init_db()
 
+def run_worker(shard=0, shards=1):
+    set_version_writer(shard)
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(store_all_patients_data())
+    loop.run_until_complete(store_all_patients_data(shard, shards))
+
+
+def run_sharded(shards=INGEST_SHARDS):
+    if shards == 1:
+        run_worker()
+        return
+
+    # SQLite connections must not be shared with forked workers.
+    engine.dispose()
+    workers = [
+        multiprocessing.Process(
+            target=run_worker, args=(shard, shards), name=f"ingester-{shard}"
+        )
+        for shard in range(shards)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    init_db()
+    run_sharded()
@@ -1,16 +1,69 @@
 import datetime
+import os
+import threading
+import time
 from functools import wraps
 
-from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Integer, String,
-                        create_engine)
+from sqlalchemy import (Boolean, Column, DateTime, Float, ForeignKey, Index,
+                        Integer, PrimaryKeyConstraint, String, create_engine,
+                        event, inspect)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
-engine = create_engine(
-    "sqlite+pysqlite:///database/history.sqlite",
-    connect_args={'check_same_thread': False},
-    convert_unicode=True
-)
+from database.metrics import REGISTRY
+
+DATABASE_PATH = os.environ.get("DATABASE_PATH", "database/history.sqlite")
+DATABASE_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", 8))
+DATABASE_MAX_OVERFLOW = int(os.environ.get("DATABASE_MAX_OVERFLOW", 8))
+DATABASE_BUSY_TIMEOUT = int(os.environ.get("DATABASE_BUSY_TIMEOUT", 5000))
+DATABASE_MMAP_SIZE = int(os.environ.get("DATABASE_MMAP_SIZE", 256 * 2 ** 20))
+# Negative cache_size is in KiB rather than pages.
+DATABASE_CACHE_SIZE = int(os.environ.get("DATABASE_CACHE_SIZE", -32000))
+RETENTION_MINUTES = 10
+
+
+def create_db_engine(
+    path=DATABASE_PATH,
+    read_only=False,
+    pool_size=DATABASE_POOL_SIZE,
+    max_overflow=DATABASE_MAX_OVERFLOW,
+    busy_timeout=DATABASE_BUSY_TIMEOUT,
+    mmap_size=DATABASE_MMAP_SIZE,
+    cache_size=DATABASE_CACHE_SIZE,
+):
+    if read_only:
+        url = f"sqlite+pysqlite:///file:{path}?mode=ro&uri=true"
+    else:
+        url = f"sqlite+pysqlite:///{path}"
+
+    new_engine = create_engine(
+        url,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": busy_timeout / 1000,
+        },
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+    )
+
+    @event.listens_for(new_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL is persistent in the database file, so only the writer sets it.
+        if not read_only:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        cursor.execute(f"PRAGMA mmap_size={mmap_size}")
+        cursor.execute(f"PRAGMA cache_size={cache_size}")
+        cursor.close()
+
+    return new_engine
+
+
+engine = create_db_engine()
 db_session = scoped_session(
     sessionmaker(autocommit=False, autoflush=False, bind=engine)
 )
@@ -47,6 +100,14 @@ class Patient(Base):
 
 class Sensors(Base):
     __tablename__ = "sensors"
+    __table_args__ = (
+        Index("ix_sensors_patient_measured_at", "patient_id", "measured_at"),
+        Index("ix_sensors_measured_at", "measured_at"),
+        # Plain rowids are handed out again once the newest rows are gone,
+        # which archived rows and the data plot's last ids cannot tell
+        # apart from the originals.
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, nullable=False, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
@@ -65,15 +126,161 @@ class Sensors(Base):
     measured_at = Column(DateTime, default=datetime.datetime.now)
 
 
+class SensorSummary(Base):
+    __tablename__ = "sensor_summaries"
+    __table_args__ = (
+        PrimaryKeyConstraint(
+            "patient_id", "sensor", sqlite_on_conflict="REPLACE"
+        ),
+    )
+
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    sensor = Column(String(2), nullable=False)
+    count = Column(Integer, nullable=False)
+    mean_val = Column(Float, nullable=False)
+    min_val = Column(Integer, nullable=False)
+    max_val = Column(Integer, nullable=False)
+    last_val = Column(Integer, nullable=False)
+    anomalies = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class SensorRollup(Base):
+    __tablename__ = "sensor_rollups"
+    __table_args__ = (
+        PrimaryKeyConstraint(
+            "patient_id",
+            "resolution",
+            "sensor",
+            "bucket_start",
+            sqlite_on_conflict="REPLACE",
+        ),
+        Index("ix_sensor_rollups_resolution_bucket",
+              "resolution", "bucket_start"),
+    )
+
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    resolution = Column(Integer, nullable=False)
+    sensor = Column(String(2), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False)
+    sum_val = Column(Float, nullable=False)
+    min_val = Column(Integer, nullable=False)
+    max_val = Column(Integer, nullable=False)
+    anomalies = Column(Integer, nullable=False)
+
+
+class ArchivePartition(Base):
+    __tablename__ = "archive_partitions"
+    __table_args__ = (
+        Index("ix_archive_partitions_patient_range",
+              "patient_id", "start_at", "end_at"),
+    )
+
+    id = Column(Integer, nullable=False, primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    hour = Column(DateTime, nullable=False)
+    path = Column(String(255), nullable=False)
+    rows = Column(Integer, nullable=False)
+    start_at = Column(DateTime, nullable=False)
+    end_at = Column(DateTime, nullable=False)
+
+
+session_seconds = REGISTRY.histogram(
+    "db_session_seconds",
+    "Time spent in database_session functions.",
+    labels=("function",),
+)
+rows_read = REGISTRY.counter(
+    "db_rows_read_total",
+    "Rows returned by database_session functions.",
+    labels=("function",),
+)
+# Database time of the current thread, split out of callback timings.
+_query_clock = threading.local()
+
+
+def take_query_seconds():
+    seconds = getattr(_query_clock, "seconds", 0.0)
+    _query_clock.seconds = 0.0
+    return seconds
+
+
+def result_rows(result):
+    # Frames and lists of rows; scalars such as versions are not counted.
+    if isinstance(result, list) or getattr(result, "ndim", 0) > 0:
+        return len(result)
+    return 0
+
+
 def database_session(f):
     @wraps(f)
     def _use_session(*args, **kwargs):
+        started = time.perf_counter()
+        result = None
         session = db_session()
-        result = f(session, *args, **kwargs)
-        db_session.remove()
-        return result
+        try:
+            result = f(session, *args, **kwargs)
+            return result
+        finally:
+            # Failed reads, such as a busy database, are timed as well.
+            db_session.remove()
+            elapsed = time.perf_counter() - started
+            session_seconds.observe(elapsed, function=f.__name__)
+            rows_read.inc(result_rows(result), function=f.__name__)
+            _query_clock.seconds = (
+                getattr(_query_clock, "seconds", 0.0) + elapsed
+            )
     return _use_session
 
 
+def _rebuild_with_autoincrement(bind, table):
+    # AUTOINCREMENT cannot be added to an existing table; it is copied into
+    # a new one, keeping every id.
+    with bind.begin() as connection:
+        sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table.name,),
+        ).scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            return
+        old_name = f"{table.name}_before_autoincrement"
+        connection.exec_driver_sql(
+            f"ALTER TABLE {table.name} RENAME TO {old_name}"
+        )
+        for index in table.indexes:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+        table.create(bind=connection)
+        columns = ", ".join(table.columns.keys())
+        connection.exec_driver_sql(
+            f"INSERT INTO {table.name} ({columns}) "
+            f"SELECT {columns} FROM {old_name}"
+        )
+        connection.exec_driver_sql(f"DROP TABLE {old_name}")
+
+
+def migrate_db(bind=engine):
+    # create_all() skips tables that already exist, so indexes added after
+    # a history.sqlite was created have to be built explicitly.
+    for table in Base.metadata.sorted_tables:
+        if table.dialect_options["sqlite"]["autoincrement"]:
+            _rebuild_with_autoincrement(bind, table)
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+
+
+def use_read_only_engine(**engine_options):
+    db_session.remove()
+    reader_engine = create_db_engine(read_only=True, **engine_options)
+    db_session.configure(bind=reader_engine)
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate_db()
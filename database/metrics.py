@@ -0,0 +1,326 @@
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+# With several processes, such as gunicorn workers, each one writes its
+# registry to a file in METRICS_DIRECTORY and a scrape merges all of them,
+# the way prometheus_client's multiprocess mode does.
+METRICS_DIRECTORY = os.environ.get("METRICS_DIRECTORY")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0))
+# Seconds, from a cached version check up to a cold render.
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def label_key(label_names, labels):
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+
+def format_labels(label_names, key, extra=()):
+    pairs = list(zip(label_names, key)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(
+            name, value.replace("\\", "\\\\").replace('"', '\\"')
+        )
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {} if self.labels else {(): 0}
+        self._lock = threading.Lock()
+
+    @property
+    def value(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def inc(self, amount=1, **labels):
+        key = label_key(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def state(self):
+        with self._lock:
+            values = [
+                [list(key), value] for key, value in self._values.items()
+            ]
+        return {
+            "kind": self.kind,
+            "description": self.description,
+            "labels": list(self.labels),
+            "values": values,
+        }
+
+    def merge(self, state):
+        with self._lock:
+            for key, value in state["values"]:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, format_labels(self.labels, key), value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def state(self):
+        return {
+            "kind": self.kind,
+            "description": self.description,
+            "value": self.value,
+        }
+
+    def merge(self, state):
+        # Summed over the live processes.
+        self.value += state["value"]
+
+    def samples(self):
+        yield self.name, "", self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: one count per bucket plus +Inf, the sum, the count.
+        self._series = {}
+        self._lock = threading.Lock()
+
+    @property
+    def value(self):
+        with self._lock:
+            return sum(series[2] for series in self._series.values())
+
+    def observe(self, value, **labels):
+        key = label_key(self.labels, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[key] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def state(self):
+        with self._lock:
+            series = [
+                [list(key), list(counts), total, count]
+                for key, (counts, total, count) in self._series.items()
+            ]
+        return {
+            "kind": self.kind,
+            "description": self.description,
+            "labels": list(self.labels),
+            "buckets": list(self.buckets),
+            "series": series,
+        }
+
+    def merge(self, state):
+        with self._lock:
+            for key, counts, total, count in state["series"]:
+                key = tuple(key)
+                series = self._series.get(key)
+                if series is None:
+                    series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                    self._series[key] = series
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+    def samples(self):
+        with self._lock:
+            series = [
+                (key, list(counts), total, count)
+                for key, (counts, total, count) in self._series.items()
+            ]
+        for key, counts, total, count in series:
+            cumulative = 0
+            bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                yield (
+                    f"{self.name}_bucket",
+                    format_labels(self.labels, key, [("le", bound)]),
+                    cumulative,
+                )
+            labels = format_labels(self.labels, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name, description, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, description, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, description="", labels=()):
+        return self._get_or_create(Counter, name, description, labels=labels)
+
+    def gauge(self, name, description=""):
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name, description="", labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(
+            Histogram, name, description, labels=labels, buckets=buckets
+        )
+
+    def state(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.state() for metric in metrics}
+
+    def merge(self, state, gauges=True):
+        for name, metric_state in state.items():
+            kind = metric_state["kind"]
+            if kind == "gauge" and not gauges:
+                continue
+            options = {}
+            for option in ("labels", "buckets"):
+                if option in metric_state:
+                    options[option] = tuple(metric_state[option])
+            metric = self._get_or_create(
+                METRIC_KINDS[kind],
+                name,
+                metric_state["description"],
+                **options,
+            )
+            metric.merge(metric_state)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.value for metric in metrics}
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4.
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            if metric.description:
+                lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRIC_KINDS = {
+    metric_class.kind: metric_class
+    for metric_class in (Counter, Gauge, Histogram)
+}
+
+
+def state_path(directory, pid):
+    return os.path.join(directory, f"metrics-{pid}.json")
+
+
+def read_state(path):
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_state(path, state):
+    # Replaced in one step, so a scrape never reads half a file.
+    temporary = f"{path}.{threading.get_ident()}.tmp"
+    with open(temporary, "w") as output:
+        json.dump(state, output)
+    os.replace(temporary, path)
+
+
+def start_flushing(registry, directory, interval=METRICS_FLUSH_INTERVAL):
+    # A new process that reuses the pid of an exited one carries on its
+    # counters, so the merged totals never go down.
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    path = state_path(directory, os.getpid())
+    registry.merge(read_state(path), gauges=False)
+
+    def flush():
+        write_state(path, registry.state())
+
+    def run():
+        while True:
+            time.sleep(interval)
+            flush()
+
+    flush()
+    threading.Thread(target=run, name="metrics-flusher", daemon=True).start()
+    atexit.register(flush)
+    return flush
+
+
+def mark_process_dead(directory, pid):
+    # Counters and histograms of an exited process stay in the totals; its
+    # gauges no longer describe anything.
+    path = state_path(directory, pid)
+    state = read_state(path)
+    if state:
+        write_state(
+            path,
+            {
+                name: metric
+                for name, metric in state.items()
+                if metric["kind"] != "gauge"
+            },
+        )
+
+
+def merged_registry(directory, live=None):
+    # The scraped process contributes its live registry rather than its
+    # last flushed file.
+    registry = Registry()
+    own_path = state_path(directory, os.getpid())
+    for path in sorted(glob.glob(os.path.join(directory, "metrics-*.json"))):
+        if live is None or path != own_path:
+            registry.merge(read_state(path))
+    if live is not None:
+        registry.merge(live.state())
+    return registry
+
+
+REGISTRY = Registry()
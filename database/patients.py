@@ -0,0 +1,61 @@
+import os
+import zlib
+
+from database.db import Patient, database_session
+
+DEFAULT_PATIENTS_ID_LIST = "1-6"
+# "config" only monitors PATIENTS_ID_LIST, "database" also keeps
+# monitoring every patient already stored in the patients table.
+PATIENTS_SOURCE = os.environ.get("PATIENTS_SOURCE", "config")
+
+
+def parse_patient_ids(spec):
+    patient_ids = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            patient_ids.extend(
+                str(i) for i in range(int(first), int(last) + 1)
+            )
+        else:
+            patient_ids.append(str(int(part)))
+    return patient_ids
+
+
+def configured_patient_ids():
+    return parse_patient_ids(
+        os.environ.get("PATIENTS_ID_LIST", DEFAULT_PATIENTS_ID_LIST)
+    )
+
+
+@database_session
+def stored_patient_ids(session):
+    return [str(row.id) for row in session.query(Patient.id)]
+
+
+def discover_patient_ids(source=PATIENTS_SOURCE):
+    patient_ids = configured_patient_ids()
+    if source == "database":
+        known = set(patient_ids)
+        patient_ids += [
+            patient_id
+            for patient_id in stored_patient_ids()
+            if patient_id not in known
+        ]
+    return patient_ids
+
+
+def shard_of(patient_id, shards):
+    # crc32 is stable across processes, unlike the salted built-in hash().
+    return zlib.crc32(str(patient_id).encode()) % shards
+
+
+def shard_patient_ids(patient_ids, shard, shards):
+    return [
+        patient_id
+        for patient_id in patient_ids
+        if shard_of(patient_id, shards) == shard
+    ]
@@ -0,0 +1,63 @@
+import asyncio
+import random
+import time
+
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN = 30.0
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 0.2
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self._failures = {}
+        self._open_until = {}
+
+    def allow(self, key):
+        open_until = self._open_until.get(key)
+        if open_until is None:
+            return True
+        if self.clock() >= open_until:
+            # Half-open: let one probe through, a failure re-opens at once.
+            del self._open_until[key]
+            self._failures[key] = self.failure_threshold - 1
+            return True
+        return False
+
+    def is_open(self, key):
+        # Past its cooldown a breaker is half-open: the next allow() lets a
+        # probe through.
+        open_until = self._open_until.get(key)
+        return open_until is not None and self.clock() < open_until
+
+    def record_success(self, key):
+        self._failures.pop(key, None)
+
+    def record_failure(self, key):
+        failures = self._failures.get(key, 0) + 1
+        self._failures[key] = failures
+        if failures >= self.failure_threshold:
+            self._open_until[key] = self.clock() + self.cooldown
+            return True
+        return False
+
+
+async def retry_async(call, attempts=RETRY_ATTEMPTS,
+                      base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                      retry_on=(Exception,), on_retry=None):
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except retry_on:
+            if attempt == attempts - 1:
+                raise
+            if on_retry is not None:
+                on_retry()
+            # Full jitter keeps retries of many patients from synchronising.
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            await asyncio.sleep(random.uniform(0, delay))
@@ -0,0 +1,243 @@
+import datetime
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.db import DATABASE_PATH, RETENTION_MINUTES
+from database.rolling import SENSOR_NAMES
+
+RING_DIRECTORY = os.path.join(os.path.dirname(DATABASE_PATH), "ring")
+RING_CAPACITY = 1024
+SNAPSHOT_RETRIES = 16
+# Seconds between snapshot attempts, doubling up to the maximum.
+SNAPSHOT_BACKOFF = 0.0001
+SNAPSHOT_MAX_BACKOFF = 0.005
+
+# Bumped with the file layout; older files are recreated by the writer.
+_MAGIC = 0x324E4952
+_HEADER = 4  # magic, capacity, appended samples, sequence
+
+
+class SnapshotBusy(RuntimeError):
+    pass
+
+
+class SensorsRingBuffer:
+    # File layout: int64 header, int64 SQLite row ids, int64 timestamps,
+    # int16 values per sensor and one uint8 anomaly bitmask per sample.
+
+    def __init__(self, path, writable=False, capacity=RING_CAPACITY):
+        if writable and self._magic(path) != _MAGIC:
+            self._create(path, capacity)
+        mode = "r+" if writable else "r"
+        self.buffer = np.memmap(path, dtype=np.uint8, mode=mode)
+        self.header = self.buffer[: _HEADER * 8].view(np.int64)
+        if self.header[0] != _MAGIC:
+            raise ValueError(f"{path} is not a sensors ring buffer")
+        self.capacity = capacity = int(self.header[1])
+
+        offset = _HEADER * 8
+        self.ids = self.buffer[offset: offset + 8 * capacity].view(np.int64)
+        offset += 8 * capacity
+        self.timestamps = self.buffer[offset: offset + 8 * capacity].view(
+            np.int64
+        )
+        offset += 8 * capacity
+        size = 2 * len(SENSOR_NAMES) * capacity
+        self.values = (
+            self.buffer[offset: offset + size]
+            .view(np.int16)
+            .reshape(len(SENSOR_NAMES), capacity)
+        )
+        offset += size
+        self.anomalies = self.buffer[offset: offset + capacity]
+
+    @staticmethod
+    def _magic(path):
+        try:
+            return int(np.fromfile(path, dtype=np.int64, count=1)[0])
+        except (FileNotFoundError, IndexError):
+            return None
+
+    @staticmethod
+    def _create(path, capacity):
+        size = _HEADER * 8 + (16 + 2 * len(SENSOR_NAMES) + 1) * capacity
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        buffer = np.memmap(tmp_path, dtype=np.uint8, mode="w+", shape=size)
+        header = buffer[: _HEADER * 8].view(np.int64)
+        header[:] = [_MAGIC, capacity, 0, 0]
+        buffer.flush()
+        del buffer
+        # Readers never see a half-initialised file.
+        os.replace(tmp_path, path)
+
+    def append(self, row_id, measured_at, values, anomalies):
+        # Seqlock: the sequence is odd while a sample is being written.
+        sequence = self.header[3]
+        self.header[3] = sequence + 1
+        slot = self.header[2] % self.capacity
+        self.ids[slot] = row_id
+        self.timestamps[slot] = measured_at
+        self.values[:, slot] = values
+        self.anomalies[slot] = anomalies
+        self.header[2] += 1
+        self.header[3] = sequence + 2
+
+    def segments(self):
+        # Zero-copy views in time order; they can be overwritten by the
+        # writer, so compare sequence() before and after using them.
+        count = int(self.header[2])
+        if count <= self.capacity:
+            slices = [slice(0, count)]
+        else:
+            slot = count % self.capacity
+            slices = [slice(slot, self.capacity), slice(0, slot)]
+        return [
+            (self.ids[s], self.timestamps[s], self.values[:, s],
+             self.anomalies[s])
+            for s in slices
+        ]
+
+    def sequence(self):
+        return int(self.header[3])
+
+    def latest_id(self):
+        # Only called by the writer, which no sample can change under.
+        count = int(self.header[2])
+        if not count:
+            return 0
+        return int(self.ids[(count - 1) % self.capacity])
+
+    def snapshot(self):
+        for attempt in range(SNAPSHOT_RETRIES):
+            if attempt:
+                # The writer is another process; sleeping hands it the CPU
+                # instead of spinning on a sequence it cannot advance.
+                time.sleep(
+                    min(SNAPSHOT_BACKOFF * 2 ** attempt, SNAPSHOT_MAX_BACKOFF)
+                )
+            sequence = self.sequence()
+            if sequence % 2:
+                continue
+            segments = self.segments()
+            ids = np.concatenate([s[0] for s in segments])
+            timestamps = np.concatenate([s[1] for s in segments])
+            values = np.concatenate([s[2] for s in segments], axis=1)
+            anomalies = np.concatenate([s[3] for s in segments])
+            if self.sequence() == sequence:
+                return ids, timestamps, values, anomalies
+        raise SnapshotBusy("ring buffer kept changing during the snapshot")
+
+
+def pack_anomalies(row):
+    bits = 0
+    for i, name in enumerate(SENSOR_NAMES):
+        if row[f"{name}_anom"]:
+            bits |= 1 << i
+    return bits
+
+
+def _datetime_ns(value):
+    return np.datetime64(value, "ns").astype(np.int64)
+
+
+class RingBufferStore:
+    def __init__(self, directory=RING_DIRECTORY, capacity=RING_CAPACITY,
+                 minutes=RETENTION_MINUTES, backfill=None):
+        self.directory = directory
+        self.capacity = capacity
+        self.minutes = minutes
+        # backfill(patient_id, last_id) returns the stored rows after
+        # last_id as a frame indexed by id.
+        self.backfill = backfill
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def _path(self, patient_id):
+        return os.path.join(self.directory, f"{int(patient_id)}.ring")
+
+    def buffer(self, patient_id, writable=False):
+        key = (int(patient_id), writable)
+        with self._lock:
+            ring = self._buffers.get(key)
+            if ring is None:
+                path = self._path(patient_id)
+                if writable:
+                    os.makedirs(self.directory, exist_ok=True)
+                elif SensorsRingBuffer._magic(path) != _MAGIC:
+                    # Not written yet, or still in an older layout.
+                    return None
+                ring = SensorsRingBuffer(path, writable, self.capacity)
+                self._buffers[key] = ring
+            return ring
+
+    def _append_frame(self, ring, frame):
+        anomalies = np.zeros(len(frame), dtype=np.uint8)
+        for i, name in enumerate(SENSOR_NAMES):
+            bits = frame[f"{name}_anom"].to_numpy(dtype=np.uint8)
+            anomalies |= bits << np.uint8(i)
+        measured_at = pd.to_datetime(frame["measured_at"]).to_numpy(
+            "datetime64[ns]"
+        )
+        values = frame[[f"{name}_val" for name in SENSOR_NAMES]].to_numpy()
+        for row_id, timestamp, sample, bits in zip(
+            frame.index, measured_at.astype(np.int64), values, anomalies
+        ):
+            ring.append(row_id, timestamp, sample, bits)
+
+    def _open_for_append(self, patient_id, before_id):
+        # A ring opened for the first time by this process misses the rows
+        # stored while no writer appended to it: a new file, or a restart
+        # of the ingester. They are copied over from SQLite first.
+        key = (int(patient_id), True)
+        ring = self._buffers.get(key)
+        if ring is not None:
+            return ring
+        ring = self.buffer(patient_id, writable=True)
+        if self.backfill is not None:
+            stored = self.backfill(patient_id, ring.latest_id())
+            stored = stored[stored.index < before_id].tail(self.capacity)
+            self._append_frame(ring, stored)
+        return ring
+
+    def append_rows(self, rows):
+        # Rows carry the ids SQLite gave them, so both stores number the
+        # samples the same way.
+        for row in rows:
+            ring = self._open_for_append(row["patient_id"], row["id"])
+            ring.append(
+                row["id"],
+                _datetime_ns(row["measured_at"]),
+                [row[f"{name}_val"] for name in SENSOR_NAMES],
+                pack_anomalies(row),
+            )
+
+    def patient_frame(self, patient_id):
+        # Serves the get_all_patient_sensors() DataFrame contract; None
+        # while the patient has no ring yet.
+        ring = self.buffer(patient_id)
+        if ring is None:
+            return None
+
+        columns = ["patient_id"]
+        for name in SENSOR_NAMES:
+            columns += [f"{name}_val", f"{name}_anom"]
+        columns.append("measured_at")
+
+        ids, timestamps, values, anomalies = ring.snapshot()
+        threshold = _datetime_ns(
+            datetime.datetime.now() - datetime.timedelta(minutes=self.minutes)
+        )
+        first = np.searchsorted(timestamps, threshold)
+
+        data = {"patient_id": np.full(len(ids) - first, int(patient_id))}
+        for i, name in enumerate(SENSOR_NAMES):
+            data[f"{name}_val"] = values[i, first:].astype(np.int64)
+            data[f"{name}_anom"] = (anomalies[first:] >> i) & 1 == 1
+        data["measured_at"] = timestamps[first:].astype("datetime64[ns]")
+        return pd.DataFrame(
+            data, index=pd.Index(ids[first:], name="id"), columns=columns
+        )
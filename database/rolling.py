@@ -0,0 +1,67 @@
+from collections import deque
+
+SENSOR_NAMES = ["L0", "L1", "L2", "R0", "R1", "R2"]
+
+
+class RollingSensor:
+    def __init__(self):
+        self.samples = deque()
+        self.total = 0
+        self.anomalies = 0
+        # Monotonic deques: the front is always the window min / max.
+        self._min = deque()
+        self._max = deque()
+
+    def add(self, measured_at, value, anomaly):
+        self.samples.append((measured_at, value, anomaly))
+        self.total += value
+        self.anomalies += int(bool(anomaly))
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((measured_at, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((measured_at, value))
+
+    def evict(self, threshold):
+        while self.samples and self.samples[0][0] < threshold:
+            measured_at, value, anomaly = self.samples.popleft()
+            self.total -= value
+            self.anomalies -= int(bool(anomaly))
+        while self._min and self._min[0][0] < threshold:
+            self._min.popleft()
+        while self._max and self._max[0][0] < threshold:
+            self._max.popleft()
+
+    def summary(self):
+        count = len(self.samples)
+        if not count:
+            return None
+        return {
+            "count": count,
+            "mean": self.total / count,
+            "min": self._min[0][1],
+            "max": self._max[0][1],
+            "anomalies": self.anomalies,
+            "last": self.samples[-1][1],
+        }
+
+
+class RollingAggregates:
+    def __init__(self, sensors_list=SENSOR_NAMES):
+        self.sensors = {name: RollingSensor() for name in sensors_list}
+
+    def add(self, row):
+        for name, sensor in self.sensors.items():
+            sensor.add(
+                row["measured_at"], row[f"{name}_val"], row[f"{name}_anom"]
+            )
+
+    def evict(self, threshold):
+        for sensor in self.sensors.values():
+            sensor.evict(threshold)
+
+    def summaries(self):
+        return {
+            name: sensor.summary() for name, sensor in self.sensors.items()
+        }
@@ -0,0 +1,92 @@
+import datetime
+
+from database.rolling import SENSOR_NAMES
+
+# Bucket sizes in seconds; all of them divide a day.
+ROLLUP_RESOLUTIONS = [10, 60, 600]
+# How long each resolution is kept.
+ROLLUP_RETENTION = {
+    10: datetime.timedelta(days=1),
+    60: datetime.timedelta(days=7),
+    600: datetime.timedelta(days=90),
+}
+
+
+def bucket_start(measured_at, resolution):
+    midnight = measured_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    seconds = (measured_at - midnight).total_seconds()
+    return midnight + datetime.timedelta(
+        seconds=seconds // resolution * resolution
+    )
+
+
+class RollupBucket:
+    def __init__(self, start, sensors_list=SENSOR_NAMES):
+        self.start = start
+        # count, sum, min, max, anomalies
+        self.sensors = {name: [0, 0, None, None, 0] for name in sensors_list}
+
+    def add(self, row):
+        for name, stats in self.sensors.items():
+            value = row[f"{name}_val"]
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = value if stats[2] is None else min(stats[2], value)
+            stats[3] = value if stats[3] is None else max(stats[3], value)
+            stats[4] += int(bool(row[f"{name}_anom"]))
+
+    def copy(self):
+        bucket = RollupBucket(self.start, [])
+        bucket.sensors = {
+            name: list(stats) for name, stats in self.sensors.items()
+        }
+        return bucket
+
+    def rows(self, patient_id, resolution):
+        return [
+            {
+                "patient_id": patient_id,
+                "resolution": resolution,
+                "sensor": name,
+                "bucket_start": self.start,
+                "count": count,
+                "sum_val": total,
+                "min_val": minimum,
+                "max_val": maximum,
+                "anomalies": anomalies,
+            }
+            for name, (count, total, minimum, maximum, anomalies)
+            in self.sensors.items()
+            if count
+        ]
+
+
+class PatientRollups:
+    def __init__(self, patient_id, resolutions=ROLLUP_RESOLUTIONS,
+                 sensors_list=SENSOR_NAMES):
+        self.patient_id = patient_id
+        self.sensors_list = sensors_list
+        self.buckets = dict.fromkeys(resolutions)
+
+    def copy(self):
+        rollups = PatientRollups(
+            self.patient_id, list(self.buckets), self.sensors_list
+        )
+        for resolution, bucket in self.buckets.items():
+            if bucket is not None:
+                rollups.buckets[resolution] = bucket.copy()
+        return rollups
+
+    def add(self, row):
+        # Returns the rollup rows of buckets closed by this sample; open
+        # buckets are only written once they are complete.
+        closed = []
+        for resolution, bucket in self.buckets.items():
+            start = bucket_start(row["measured_at"], resolution)
+            if bucket is None or bucket.start != start:
+                if bucket is not None:
+                    closed += bucket.rows(self.patient_id, resolution)
+                bucket = RollupBucket(start, self.sensors_list)
+                self.buckets[resolution] = bucket
+            bucket.add(row)
+        return closed
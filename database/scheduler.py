@@ -0,0 +1,93 @@
+import asyncio
+import concurrent.futures
+import logging
+
+from database.metrics import REGISTRY
+
+logger = logging.getLogger("patients-monitor")
+
+WRITER_QUEUE_SIZE = 8
+
+
+class FixedRateScheduler:
+    def __init__(self, period, registry=REGISTRY):
+        self.period = period
+        self.ticks = registry.counter(
+            "ingest_ticks_total", "Ingestion ticks started."
+        )
+        self.skipped = registry.counter(
+            "ingest_skipped_ticks_total",
+            "Ticks skipped because the previous tick overran its period.",
+        )
+        self.lateness = registry.gauge(
+            "ingest_tick_lateness_seconds",
+            "Delay between the scheduled and the actual start of a tick.",
+        )
+        self.max_lateness = registry.gauge(
+            "ingest_tick_max_lateness_seconds",
+            "Largest tick start delay observed.",
+        )
+
+    async def run(self, tick):
+        loop = asyncio.get_running_loop()
+        # Deadlines are fixed multiples of the period, so time spent inside
+        # a tick does not accumulate as drift.
+        next_tick = loop.time()
+        while True:
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            lateness = loop.time() - next_tick
+            self.lateness.set(lateness)
+            self.max_lateness.set(max(self.max_lateness.value, lateness))
+            self.ticks.inc()
+            await tick()
+
+            next_tick += self.period
+            overrun = loop.time() - next_tick
+            if overrun >= self.period:
+                missed = int(overrun // self.period)
+                self.skipped.inc(missed)
+                next_tick += missed * self.period
+
+
+class BatchWriter:
+    def __init__(self, write, maxsize=WRITER_QUEUE_SIZE, registry=REGISTRY):
+        self.write = write
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # One thread keeps the writes ordered and off the event loop.
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.written = registry.counter(
+            "ingest_batches_written_total", "Batches committed to SQLite."
+        )
+        self.dropped = registry.counter(
+            "ingest_batches_dropped_total",
+            "Batches dropped because the writer queue was full.",
+        )
+        self.failed = registry.counter(
+            "ingest_batches_failed_total", "Batches whose commit failed."
+        )
+        self.queued = registry.gauge(
+            "ingest_writer_queue_size", "Batches waiting for the writer."
+        )
+
+    def submit(self, *batch):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped.inc()
+        self.queue.put_nowait(batch)
+        self.queued.set(self.queue.qsize())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.queue.get()
+            self.queued.set(self.queue.qsize())
+            try:
+                await loop.run_in_executor(self.executor, self.write, *batch)
+            except Exception as err:
+                self.failed.inc()
+                logger.error(f"Failed to store batch: {err}")
+            else:
+                self.written.inc()
@@ -0,0 +1,74 @@
+import datetime
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from database.db import RETENTION_MINUTES
+
+WINDOW_REGISTRY_SIZE = 256
+
+
+class SensorsWindow:
+    def __init__(self, loader, minutes=RETENTION_MINUTES):
+        self.loader = loader
+        self.minutes = minutes
+        self.frame = None
+        self.last_id = 0
+        self.version = None
+        self._lock = threading.Lock()
+
+    def refresh(self, version=None):
+        with self._lock:
+            if version is not None and version == self.version:
+                return self.frame
+
+            new_rows = self.loader(self.last_id)
+            if self.frame is None or self.frame.empty:
+                frame = new_rows
+            elif new_rows.empty:
+                frame = self.frame
+            else:
+                frame = pd.concat([self.frame, new_rows])
+            frame = self._trim(frame)
+
+            # An emptied table restarts rowids, so drop the watermark as well.
+            self.last_id = int(frame.index[-1]) if not frame.empty else 0
+            self.frame = frame
+            self.version = version
+            return frame
+
+    def _trim(self, frame):
+        if frame.empty:
+            return frame
+        threshold = datetime.datetime.now() - datetime.timedelta(
+            minutes=self.minutes
+        )
+        start = frame["measured_at"].searchsorted(threshold)
+        if start == 0:
+            return frame
+        return frame.iloc[start:]
+
+
+class WindowRegistry:
+    def __init__(self, loader, maxsize=WINDOW_REGISTRY_SIZE,
+                 minutes=RETENTION_MINUTES):
+        self.loader = loader
+        self.maxsize = maxsize
+        self.minutes = minutes
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, patient_id, version=None):
+        with self._lock:
+            window = self._windows.get(patient_id)
+            if window is None:
+                window = SensorsWindow(
+                    lambda last_id: self.loader(patient_id, last_id),
+                    minutes=self.minutes,
+                )
+                self._windows[patient_id] = window
+            self._windows.move_to_end(patient_id)
+            while len(self._windows) > self.maxsize:
+                self._windows.popitem(last=False)
+        return window.refresh(version)
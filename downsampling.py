@@ -0,0 +1,104 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+MAX_VISIBLE_POINTS = 1000
+DOWNSAMPLING_METHOD = "lttb"
+ROLLUP_MIN_POINTS = MAX_VISIBLE_POINTS // 2
+
+
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # First and last points are always kept, the rest is split into
+    # threshold - 2 buckets.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[: n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[: n - 1], edges[:-1]) / counts
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y[i] - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, buckets):
+    n = len(y)
+    if buckets < 1 or 2 * buckets >= n:
+        return np.arange(n)
+
+    bucket_ids = np.arange(n) * buckets // n
+    order = np.lexsort((np.asarray(y), bucket_ids))
+    starts = np.searchsorted(bucket_ids[order], np.arange(buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+
+def target_point_count(timestamps, x_range, max_points=MAX_VISIBLE_POINTS):
+    # Budget points so that the zoomed range gets about max_points, which
+    # turns into full resolution once the user zooms in far enough.
+    if x_range is None:
+        return max_points
+    start = pd.to_datetime(x_range[0]).to_datetime64()
+    end = pd.to_datetime(x_range[1]).to_datetime64()
+    first = np.searchsorted(timestamps, start, side="left")
+    visible = np.searchsorted(timestamps, end, side="right") - first
+    if visible <= 0:
+        return max_points
+    return int(max_points * len(timestamps) / visible)
+
+
+def rollup_resolution(x_range, resolutions, min_points=ROLLUP_MIN_POINTS,
+                      retention=None, now=None):
+    # The coarsest bucket size that still leaves min_points in the zoomed
+    # range; None means raw rows are needed. Resolutions already pruned at
+    # the start of the range give way to the next coarser one still kept.
+    if x_range is None:
+        return None
+    start = pd.to_datetime(x_range[0])
+    span = pd.to_datetime(x_range[1]) - start
+    wanted = None
+    for resolution in sorted(resolutions, reverse=True):
+        if span.total_seconds() / resolution >= min_points:
+            wanted = resolution
+            break
+    if wanted is None or retention is None:
+        return wanted
+
+    now = now or datetime.datetime.now()
+    for resolution in sorted(resolutions):
+        if resolution >= wanted and now - retention[resolution] <= start:
+            return resolution
+    return None
+
+
+def downsample_frame(frame, x_column, y_column, x_range=None,
+                     max_points=MAX_VISIBLE_POINTS,
+                     method=DOWNSAMPLING_METHOD):
+    timestamps = frame[x_column].to_numpy(dtype="datetime64[ns]")
+    target = target_point_count(timestamps, x_range, max_points)
+    if target >= len(frame):
+        return frame
+
+    values = frame[y_column].to_numpy(dtype=np.float64)
+    if method == "minmax":
+        indices = minmax_indices(values, target // 2)
+    else:
+        indices = lttb_indices(timestamps.view(np.int64), values, target)
+    return frame.iloc[indices]
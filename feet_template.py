@@ -0,0 +1,118 @@
+FEET_SENSORS = ["L0", "L1", "L2", "R0", "R1", "R2"]
+FEET_CORD_X = [160, 125, 143, 227, 262, 244]
+FEET_CORD_Y = [325, 295, 135, 325, 295, 135]
+FEET_TEXTBOXES = {
+    "L0": [10, 400, 97.5, 490],
+    "L1": [10, 220, 97.5, 310],
+    "L2": [10, 40, 97.5, 130],
+    "R0": [290, 400, 377.5, 490],
+    "R1": [290, 220, 377.5, 310],
+    "R2": [290, 40, 377.5, 130],
+}
+SENSOR_COLORSCALE = [
+    [0, "rgb(255,255,255)"],
+    [0.2, "rgb(255,133,102)"],
+    [0.4, "rgb(255,112,77)"],
+    [0.6, "rgb(255,92,51)"],
+    [0.8, "rgb(255,71,26)"],
+    [1, "rgb(255,0,0)"],
+]
+TEXTBOX_LINES = 4
+
+_HIDDEN_AXIS = {"showgrid": False, "zeroline": False, "visible": False}
+
+
+def textbox_line_positions(cord, lines=TEXTBOX_LINES):
+    return [
+        (
+            cord[0] + ((cord[2] - cord[0]) / 2),
+            cord[3] - (i + 1) * ((cord[3] - cord[1]) / (lines + 1)),
+        )
+        for i in range(lines)
+    ]
+
+
+def _annotation(x, y, color):
+    return {
+        "x": x,
+        "y": y,
+        "text": "",
+        "visible": False,
+        "showarrow": False,
+        "font": {
+            "family": "Courier New, monospace",
+            "size": 16,
+            "color": color,
+        },
+    }
+
+
+def build_feet_template(image_url, sensors_list=FEET_SENSORS,
+                        cord_x=FEET_CORD_X, cord_y=FEET_CORD_Y,
+                        textboxes=FEET_TEXTBOXES):
+    # The feet picture, axes and hidden placeholders for the markers and
+    # textboxes as a plain dict, so nothing goes through plotly validation.
+    annotations = [
+        _annotation(x, y, "#000000") for x, y in zip(cord_x, cord_y)
+    ]
+    shapes = []
+    for cord in textboxes.values():
+        shapes.append(
+            {
+                "type": "rect",
+                "x0": cord[0],
+                "y0": cord[1],
+                "x1": cord[2],
+                "y1": cord[3],
+                "line": {"color": "#636363", "width": 3},
+                "visible": False,
+            }
+        )
+        annotations += [
+            _annotation(x, y, "#ffffff")
+            for x, y in textbox_line_positions(cord)
+        ]
+
+    return {
+        "data": [
+            {
+                "type": "scatter",
+                "x": list(cord_x),
+                "y": list(cord_y),
+                "mode": "markers",
+                "visible": False,
+                "marker": {
+                    "colorscale": SENSOR_COLORSCALE,
+                    "color": [0] * len(sensors_list),
+                    "size": [30] * len(sensors_list),
+                    "line": {"width": 2, "color": "#000000"},
+                    "showscale": False,
+                },
+            }
+        ],
+        "layout": {
+            "width": 1094,
+            "height": 800,
+            "margin": {"l": 0, "r": 0, "t": 0, "b": 0},
+            "paper_bgcolor": "Black",
+            "plot_bgcolor": "Black",
+            "images": [
+                {
+                    "source": image_url,
+                    "xref": "x",
+                    "yref": "y",
+                    "x": 100,
+                    "y": 420,
+                    "sizex": 700,
+                    "sizey": 350,
+                    "sizing": "contain",
+                    "opacity": 1.0,
+                    "layer": "below",
+                }
+            ],
+            "xaxis": dict(_HIDDEN_AXIS, range=[0, 390]),
+            "yaxis": dict(_HIDDEN_AXIS, range=[0, 490]),
+            "shapes": shapes,
+            "annotations": annotations,
+        },
+    }
@@ -0,0 +1,37 @@
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get("DASH_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("DASH_WORKERS", multiprocessing.cpu_count()))
+# Event streams are served by push.py, so threads only run short callback
+# requests.
+worker_class = "gthread"
+threads = int(os.environ.get("DASH_THREADS", 16))
+
+# Workers share query results and rendered figures through files instead of
+# each reading SQLite.
+os.environ.setdefault("SNAPSHOT_CACHE_BACKEND", "file")
+
+# Workers write their metrics here and /metrics merges them.
+os.environ.setdefault(
+    "METRICS_DIRECTORY",
+    os.path.join(
+        tempfile.gettempdir(), f"plotly-dash-steps-metrics-{os.getuid()}"
+    ),
+)
+
+
+def on_starting(server):
+    # Totals start over with the server, not with each worker.
+    directory = os.environ["METRICS_DIRECTORY"]
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "metrics-*")):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from database.metrics import mark_process_dead
+
+    mark_process_dead(os.environ["METRICS_DIRECTORY"], worker.pid)
@@ -0,0 +1,169 @@
+import collections
+import os
+import sys
+import threading
+import time
+from functools import wraps
+
+import flask
+from flask import Response, g
+
+from database.db import take_query_seconds
+from database.metrics import (METRICS_DIRECTORY, REGISTRY, merged_registry,
+                              start_flushing)
+
+# Callbacks slower than this many milliseconds write their sampled stacks
+# to PROFILE_PATH; 0 leaves the sampler off.
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+PROFILE_PATH = os.environ.get("PROFILE_PATH", "profiles/callbacks.folded")
+PAYLOAD_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+callback_seconds = REGISTRY.histogram(
+    "dash_callback_seconds",
+    "Dash callback time by stage: query, compute, serialize and total.",
+    labels=("callback", "stage"),
+)
+payload_bytes = REGISTRY.histogram(
+    "dash_payload_bytes",
+    "Size of Dash callback responses.",
+    labels=("callback",),
+    buckets=PAYLOAD_BUCKETS,
+)
+callback_requests = REGISTRY.counter(
+    "dash_callback_requests_total",
+    "Dash callback requests by response status.",
+    labels=("callback", "status"),
+)
+
+
+def folded_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        names.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    # Samples the stacks of the threads running a callback, in the folded
+    # format flamegraph.pl and speedscope read.
+
+    def __init__(self, path=PROFILE_PATH, interval=PROFILE_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._active[thread_id] = collections.Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="stack-sampler", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[folded_stack(frame)] += 1
+
+    def dump(self, name, stacks):
+        lines = [
+            f"{name};{stack} {count}\n" for stack, count in stacks.items()
+        ]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, "a") as output:
+            output.writelines(lines)
+
+
+sampler = StackSampler() if PROFILE_SLOW_MS > 0 else None
+
+
+def instrument_callback(f):
+    name = f.__name__
+
+    @wraps(f)
+    def _instrumented(*args, **kwargs):
+        thread_id = threading.get_ident()
+        take_query_seconds()
+        if sampler is not None:
+            sampler.start(thread_id)
+        started = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            query = take_query_seconds()
+            callback_seconds.observe(query, callback=name, stage="query")
+            callback_seconds.observe(
+                max(elapsed - query, 0.0), callback=name, stage="compute"
+            )
+            if flask.has_request_context():
+                g.callback_name = name
+                g.callback_seconds = elapsed
+            if sampler is not None:
+                stacks = sampler.stop(thread_id)
+                if stacks and elapsed * 1000 >= PROFILE_SLOW_MS:
+                    sampler.dump(name, stacks)
+
+    return _instrumented
+
+
+def register_metrics(server, directory=METRICS_DIRECTORY):
+    # Every gunicorn worker keeps its own registry; with a metrics
+    # directory a scrape adds up the files of all of them.
+    if directory:
+        start_flushing(REGISTRY, directory)
+
+    @server.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @server.after_request
+    def record_callback_request(response):
+        name = g.get("callback_name")
+        if name is None:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        # The rest of the request is Dash validating the outputs and
+        # encoding them to JSON.
+        callback_seconds.observe(
+            max(elapsed - g.callback_seconds, 0.0),
+            callback=name,
+            stage="serialize",
+        )
+        callback_seconds.observe(elapsed, callback=name, stage="total")
+        payload_bytes.observe(
+            response.calculate_content_length() or 0, callback=name
+        )
+        callback_requests.inc(callback=name, status=response.status_code)
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        registry = REGISTRY
+        if directory:
+            registry = merged_registry(directory, live=REGISTRY)
+        return Response(
+            registry.render(), mimetype="text/plain; version=0.0.4"
+        )
+
+    return metrics
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+from database.cache import read_versions
+
+PUSH_HOST = os.environ.get("PUSH_HOST", "0.0.0.0")
+PUSH_PORT = int(os.environ.get("PUSH_PORT", 5001))
+# Open streams per process; further clients get a 503 and retry later.
+PUSH_MAX_STREAMS = int(os.environ.get("PUSH_MAX_STREAMS", 2000))
+# The dashboard is served from another port, so the stream needs CORS.
+PUSH_ALLOW_ORIGIN = os.environ.get("PUSH_ALLOW_ORIGIN", "*")
+PUSH_POLL_INTERVAL = 0.1
+PUSH_KEEPALIVE = 15.0
+PUSH_RETRY_MS = 1000
+
+
+class VersionWatcher:
+    # One task per process watches the ingester's version files and wakes
+    # the event streams whose patient got a new sample.
+
+    def __init__(self, poll_interval=PUSH_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._sensors = {}
+        self._condition = asyncio.Condition()
+
+    async def run(self):
+        while True:
+            versions = read_versions()
+            sensors = versions.get("sensors", {}) if versions else {}
+            if sensors != self._sensors:
+                async with self._condition:
+                    self._sensors = sensors
+                    self._condition.notify_all()
+            await asyncio.sleep(self.poll_interval)
+
+    async def wait(self, patient_id, version, timeout=PUSH_KEEPALIVE):
+        key = str(patient_id)
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(
+                        lambda: self._sensors.get(key) != version
+                    ),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                pass
+            return self._sensors.get(key)
+
+
+def create_push_app(watcher=None, max_streams=PUSH_MAX_STREAMS):
+    watcher = watcher or VersionWatcher()
+    streams = 0
+
+    async def events(request):
+        nonlocal streams
+        headers = {"Access-Control-Allow-Origin": PUSH_ALLOW_ORIGIN}
+        if streams >= max_streams:
+            raise web.HTTPServiceUnavailable(
+                headers=dict(headers, **{"Retry-After": "5"})
+            )
+        patient_id = request.query.get("patient")
+        response = web.StreamResponse(
+            headers=dict(
+                headers,
+                **{
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                    "X-Accel-Buffering": "no",
+                },
+            )
+        )
+        streams += 1
+        try:
+            await response.prepare(request)
+            await response.write(f"retry: {PUSH_RETRY_MS}\n\n".encode())
+            version = None
+            while True:
+                latest = await watcher.wait(patient_id, version)
+                if latest == version:
+                    # Also lets the server notice closed connections.
+                    await response.write(b": keepalive\n\n")
+                    continue
+                version = latest
+                # Nanosecond versions exceed the JavaScript safe integers.
+                message = json.dumps(
+                    {"patient": patient_id, "version": str(version)}
+                )
+                await response.write(f"data: {message}\n\n".encode())
+        except ConnectionResetError:
+            pass
+        finally:
+            streams -= 1
+        return response
+
+    async def start_watcher(app):
+        app["watcher"] = asyncio.ensure_future(watcher.run())
+
+    async def stop_watcher(app):
+        app["watcher"].cancel()
+
+    app = web.Application()
+    app.router.add_get("/events", events)
+    app.on_startup.append(start_watcher)
+    app.on_cleanup.append(stop_watcher)
+    return app
+
+
+if __name__ == "__main__":
+    # Streams stay open as long as a tab does, so they are served by this
+    # event loop rather than by the dashboard's worker threads.
+    web.run_app(
+        create_push_app(), host=PUSH_HOST, port=PUSH_PORT, access_log=None
+    )
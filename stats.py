@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from feet_template import FEET_SENSORS
+
+
+def window_bounds(timestamps, x_range):
+    # Same (x_min, x_max] interval as the old boolean masks, found by
+    # binary search on the time-ordered window.
+    if x_range is None:
+        return 0, len(timestamps)
+    start = pd.to_datetime(x_range[0]).to_datetime64()
+    end = pd.to_datetime(x_range[1]).to_datetime64()
+    return (
+        int(np.searchsorted(timestamps, start, side="right")),
+        int(np.searchsorted(timestamps, end, side="right")),
+    )
+
+
+def window_stats(sensors, x_range=None, sensors_list=FEET_SENSORS):
+    timestamps = sensors["measured_at"].to_numpy(dtype="datetime64[ns]")
+    values = sensors[[f"{s}_val" for s in sensors_list]].to_numpy(
+        dtype=np.float64
+    )
+    anomalies = sensors[[f"{s}_anom" for s in sensors_list]].to_numpy(
+        dtype=np.float64
+    )
+
+    first, last = window_bounds(timestamps, x_range)
+    count = max(last - first, 0)
+    window = values[first:last]
+    if count:
+        mean = window.mean(axis=0)
+        minimum = window.min(axis=0)
+        maximum = window.max(axis=0)
+        anomaly_rate = anomalies[first:last].mean(axis=0)
+    else:
+        mean = minimum = maximum = anomaly_rate = np.full(
+            len(sensors_list), np.nan
+        )
+
+    return {
+        "sensors": list(sensors_list),
+        "count": count,
+        "mean": mean,
+        "min": minimum,
+        "max": maximum,
+        "anomaly_rate": anomaly_rate,
+        # Marker colours and sizes always describe the latest sample
+        # against the whole window, whatever the zoom.
+        "last": values[-1],
+        "window_max": values.max(axis=0),
+    }
+
+
+def marker_sizes(last, window_max):
+    ratio = np.divide(
+        last, window_max, out=np.zeros_like(last), where=window_max > 0
+    )
+    return (30 + (50 * ratio).astype(int)).tolist()
+
+
+def summary_stats(summaries, sensors_list=FEET_SENSORS):
+    # The same shape as window_stats(), built from the rolling aggregates
+    # the ingester keeps in the sensor_summaries table.
+    summaries = summaries.reindex(sensors_list)
+    count = summaries["count"].to_numpy(dtype=np.float64)
+    return {
+        "sensors": list(sensors_list),
+        "count": int(np.nanmax(count)),
+        "mean": summaries["mean_val"].to_numpy(dtype=np.float64),
+        "min": summaries["min_val"].to_numpy(dtype=np.float64),
+        "max": summaries["max_val"].to_numpy(dtype=np.float64),
+        "anomaly_rate": summaries["anomalies"].to_numpy(dtype=np.float64)
+        / count,
+        "last": summaries["last_val"].to_numpy(dtype=np.float64),
+        "window_max": summaries["max_val"].to_numpy(dtype=np.float64),
+    }
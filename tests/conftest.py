@@ -0,0 +1,58 @@
+import asyncio
+import atexit
+import os
+import shutil
+import socket
+import tempfile
+
+import pytest
+
+# The database modules read their configuration at import time.
+TEST_DIRECTORY = tempfile.mkdtemp(prefix="tests-")
+atexit.register(shutil.rmtree, TEST_DIRECTORY, True)
+os.environ.setdefault(
+    "DATABASE_PATH", os.path.join(TEST_DIRECTORY, "history.sqlite")
+)
+os.environ.setdefault("SNAPSHOT_CACHE_BACKEND", "memory")
+
+from benchmarks.mock_monitor import start_mock_monitor  # noqa: E402
+from database import data  # noqa: E402
+from database.resilience import CircuitBreaker  # noqa: E402
+
+
+@pytest.fixture
+def monitor_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker()
+    monkeypatch.setattr(data, "breaker", breaker)
+    return breaker
+
+
+@pytest.fixture
+def monitor(monkeypatch, breaker, monitor_port):
+    # Serves a mock monitor app while a coroutine runs against it with a
+    # client session, the way the ingester fetches.
+    monkeypatch.setattr(
+        data,
+        "PATIENTS_MONITOR_URL",
+        f"http://127.0.0.1:{monitor_port}/v2/monitor/",
+    )
+
+    def run(app, call):
+        async def serve():
+            runner = await start_mock_monitor(app, port=monitor_port)
+            try:
+                async with data.create_client_session() as session:
+                    return await call(session)
+            finally:
+                await runner.cleanup()
+
+        return asyncio.run(serve())
+
+    return run
@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+
+from benchmarks import mock_monitor
+from benchmarks.mock_monitor import create_app, start_mock_monitor
+from database import data
+from database.db import DATABASE_PATH, init_db
+from database.resilience import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(
+        failure_threshold=3, cooldown=30, clock=FakeClock()
+    )
+
+    assert not breaker.record_failure("1")
+    assert not breaker.record_failure("1")
+    assert breaker.allow("1") and not breaker.is_open("1")
+    assert breaker.record_failure("1")
+    assert breaker.is_open("1")
+    assert not breaker.allow("1")
+    # Other patients keep their own count.
+    assert breaker.allow("2")
+
+
+def test_breaker_half_opens_after_cooldown():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=30, clock=clock)
+    for _ in range(3):
+        breaker.record_failure("1")
+
+    clock.now = 29.9
+    assert breaker.is_open("1") and not breaker.allow("1")
+    clock.now = 30.0
+    assert not breaker.is_open("1")
+    # One probe goes through; its failure re-opens the breaker at once.
+    assert breaker.allow("1")
+    assert breaker.record_failure("1")
+    assert not breaker.allow("1")
+
+    clock.now = 60.0
+    assert breaker.allow("1")
+    breaker.record_success("1")
+    assert not breaker.record_failure("1")
+    assert breaker.allow("1")
+
+
+def test_open_breaker_skips_the_request(monitor, breaker):
+    skips = data.breaker_skips.value
+    attempts = data.fetch_attempts.value
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("4")
+
+    record = monitor(
+        create_app(), lambda session: data.fetch_patient_record("4", session)
+    )
+
+    assert record is None
+    assert data.breaker_skips.value == skips + 1
+    assert data.fetch_attempts.value == attempts
+
+
+def test_ingester_stores_live_patients_and_skips_dead_ones(
+    monkeypatch, breaker, monitor_port
+):
+    breaker.failure_threshold = 2
+    port = monitor_port
+    monkeypatch.setenv("PATIENTS_ID_LIST", "1-4")
+    monkeypatch.setattr(
+        data, "PATIENTS_MONITOR_URL", f"http://127.0.0.1:{port}/v2/monitor/"
+    )
+    monkeypatch.setattr(data, "SAMPLE_PERIOD", 0.4)
+    monkeypatch.setattr(data, "MONITOR_PATIENT_TIMEOUT", 0.2)
+    monkeypatch.setattr(mock_monitor, "DEAD_ENDPOINT_DELAY", 0.5)
+    init_db()
+
+    async def ingest():
+        runner = await start_mock_monitor(
+            create_app(dead_patients=[3]), port=port
+        )
+        try:
+            await asyncio.wait_for(data.store_all_patients_data(), 2.5)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await runner.cleanup()
+        # The writer thread commits the last batch.
+        await asyncio.sleep(0.3)
+
+    asyncio.run(ingest())
+
+    with sqlite3.connect(DATABASE_PATH) as connection:
+        samples = dict(
+            connection.execute(
+                "SELECT patient_id, COUNT(*) FROM sensors GROUP BY patient_id"
+            ).fetchall()
+        )
+    assert breaker.is_open("3")
+    assert 3 not in samples
+    assert all(samples.get(patient_id) for patient_id in (1, 2, 4))
@@ -0,0 +1,75 @@
+import datetime
+import time
+
+from benchmarks import mock_monitor
+from benchmarks.mock_monitor import create_app
+from database import data
+from database.resilience import RETRY_ATTEMPTS
+from database.rolling import SENSOR_NAMES
+
+
+def test_fetch_returns_patient_and_sensor_rows(monitor):
+    measured_at = datetime.datetime(2024, 1, 1, 12)
+    record = monitor(
+        create_app(),
+        lambda session: data.fetch_patient_record("7", session, measured_at),
+    )
+
+    patient, sensors = record
+    assert patient["id"] == "7"
+    assert {"firstname", "lastname", "birthdate", "disabled"} <= set(patient)
+    assert sensors["patient_id"] == "7"
+    assert sensors["measured_at"] == measured_at
+    for name in SENSOR_NAMES:
+        assert 0 <= sensors[f"{name}_val"] <= 1023
+        assert isinstance(sensors[f"{name}_anom"], bool)
+
+
+def test_fetch_stamps_rows_when_the_tick_does_not(monitor):
+    before = datetime.datetime.now()
+    _, sensors = monitor(
+        create_app(), lambda session: data.fetch_patient_record("7", session)
+    )
+    assert before <= sensors["measured_at"] <= datetime.datetime.now()
+
+
+def test_fetch_gives_up_on_a_hanging_endpoint(monitor, monkeypatch, breaker):
+    monkeypatch.setattr(mock_monitor, "DEAD_ENDPOINT_DELAY", 1.0)
+    monkeypatch.setattr(data, "MONITOR_PATIENT_TIMEOUT", 0.2)
+    failures = data.fetch_failures.value
+
+    async def timed_fetch(session):
+        started = time.monotonic()
+        record = await data.fetch_patient_record("3", session)
+        return record, time.monotonic() - started
+
+    record, elapsed = monitor(create_app(dead_patients=[3]), timed_fetch)
+
+    assert record is None
+    assert elapsed < 0.5
+    assert data.fetch_failures.value == failures + 1
+    assert breaker._failures["3"] == 1
+
+
+def test_fetch_skips_a_malformed_payload(monitor, breaker):
+    failures = data.fetch_failures.value
+    record = monitor(
+        create_app(malformed_patients=[5]),
+        lambda session: data.fetch_patient_record("5", session),
+    )
+
+    assert record is None
+    assert data.fetch_failures.value == failures + 1
+    assert breaker._failures["5"] == 1
+
+
+def test_fetch_retries_server_errors(monitor):
+    # Every request fails, so the fetch ends after all of its attempts.
+    retries = data.fetch_retries.value
+    record = monitor(
+        create_app(failure_rate=1.0),
+        lambda session: data.fetch_patient_record("9", session),
+    )
+
+    assert record is None
+    assert data.fetch_retries.value == retries + RETRY_ATTEMPTS - 1
@@ -0,0 +1,46 @@
+import asyncio
+import sqlite3
+
+from benchmarks.mock_monitor import create_app, start_mock_monitor
+from database import data
+from database.db import DATABASE_PATH, init_db
+
+
+def stored_samples(patient_ids):
+    with sqlite3.connect(DATABASE_PATH) as connection:
+        return connection.execute(
+            "SELECT COUNT(*) FROM sensors WHERE patient_id IN "
+            f"({','.join('?' * len(patient_ids))})",
+            patient_ids,
+        ).fetchone()[0]
+
+
+def test_every_ingester_run_discovers_patients(monkeypatch, monitor_port):
+    monkeypatch.setenv("PATIENTS_ID_LIST", "41-42")
+    monkeypatch.setattr(
+        data,
+        "PATIENTS_MONITOR_URL",
+        f"http://127.0.0.1:{monitor_port}/v2/monitor/",
+    )
+    monkeypatch.setattr(data, "SAMPLE_PERIOD", 0.2)
+    init_db()
+
+    async def ingest():
+        runner = await start_mock_monitor(create_app(), port=monitor_port)
+        try:
+            await asyncio.wait_for(data.store_all_patients_data(), 1.0)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await runner.cleanup()
+        # The writer thread commits the last batch.
+        await asyncio.sleep(0.3)
+
+    # A second run in the same process starts from the ticks counter the
+    # first one left behind.
+    asyncio.run(ingest())
+    first = stored_samples([41, 42])
+    asyncio.run(ingest())
+    second = stored_samples([41, 42]) - first
+
+    assert first and second
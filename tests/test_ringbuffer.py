@@ -0,0 +1,40 @@
+import datetime
+
+from benchmarks.synthetic import synthetic_patient, synthetic_ticks
+from database import data
+from database.db import init_db
+from database.ringbuffer import RingBufferStore
+
+
+def patient_rows(patient_id, seconds, now):
+    # synthetic_ticks numbers patients from 1, so only the last one is kept.
+    return [
+        rows[-1] for rows in synthetic_ticks(patient_id, seconds, now=now)
+    ]
+
+
+def test_ring_is_backfilled_with_sqlite_ids(tmp_path):
+    init_db()
+    patient_id = 51
+    now = datetime.datetime.now()
+    bios = [synthetic_patient(patient_id)]
+    store = RingBufferStore(
+        directory=str(tmp_path),
+        backfill=lambda patient_id, last_id: data.get_patient_sensors_since(
+            patient_id, last_id
+        ),
+    )
+
+    # Rows stored before the ring backend was switched on.
+    data.store_batch(bios, patient_rows(patient_id, 30, now))
+    assert store.patient_frame(patient_id) is None
+
+    rows = patient_rows(patient_id, 5, now + datetime.timedelta(seconds=5))
+    data.store_batch([], rows)
+    store.append_rows(rows)
+
+    ring = store.patient_frame(patient_id)
+    stored = data._read_all_patient_sensors(patient_id)
+    assert len(ring) == len(stored) == 35
+    assert ring.index.tolist() == stored.index.tolist()
+    assert (ring["L0_val"] == stored["L0_val"]).all()
@@ -0,0 +1,62 @@
+import datetime
+
+import pytest
+
+from benchmarks.synthetic import synthetic_patient, synthetic_ticks
+from database import data
+from database.db import SensorRollup, SensorSummary, db_session, init_db
+
+
+def patient_ticks(patient_id, seconds, now):
+    # synthetic_ticks numbers patients from 1, so only the last one is kept.
+    for rows in synthetic_ticks(patient_id, seconds, now=now):
+        yield [rows[-1]]
+
+
+def stored_summary_count(patient_id):
+    try:
+        return (
+            db_session.query(SensorSummary.count)
+            .filter_by(patient_id=patient_id, sensor="L0")
+            .scalar()
+        )
+    finally:
+        db_session.remove()
+
+
+def stored_rollups(patient_id):
+    try:
+        return db_session.query(SensorRollup).filter_by(
+            patient_id=patient_id, resolution=10, sensor="L0"
+        ).count()
+    finally:
+        db_session.remove()
+
+
+def test_failed_commit_leaves_aggregates_unchanged(monkeypatch):
+    init_db()
+    patient_id = 31
+    bios = [synthetic_patient(patient_id)]
+    # Whole 10 s buckets, so the failed batch is the one closing a bucket.
+    now = datetime.datetime(2030, 1, 1, 12, 0, 25)
+    ticks = list(patient_ticks(patient_id, 25, now))
+
+    data.store_batch(bios, sum(ticks[:20], []), delete_outdated=False)
+    assert stored_summary_count(patient_id) == 20
+    assert stored_rollups(patient_id) == 1
+
+    def fail(session, minutes):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(data, "_delete_outdated", fail)
+    with pytest.raises(RuntimeError):
+        data.store_batch(bios, ticks[20], delete_outdated=True)
+    monkeypatch.undo()
+
+    # The open bucket still holds only stored rows, and the dropped rolling
+    # aggregates are seeded again from them.
+    data.store_batch(bios, sum(ticks[21:], []), delete_outdated=False)
+    assert stored_summary_count(patient_id) == 24
+    assert stored_rollups(patient_id) == 2
+    bucket = data._patient_rollups[patient_id].buckets[10]
+    assert bucket.sensors["L0"][0] == 4
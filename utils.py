@@ -1,126 +1,35 @@
-import plotly.graph_objects as go
 import plotly.express as px
 
+from downsampling import downsample_frame
+from stats import marker_sizes, window_stats
 
-def create_figure(app):
-    feet = go.Figure()
-    feet.update_layout(
-        width=1094,
-        height=800,
-        margin=dict(l=0, r=0, t=0, b=0),
-        paper_bgcolor="Black",
-        plot_bgcolor="Black",
-    )
-    feet.add_layout_image(
-        dict(
-            source=app.get_asset_url("image.png"),
-            xref="x",
-            yref="y",
-            x=100,
-            y=420,
-            sizex=700,
-            sizey=350,
-            sizing="contain",
-            opacity=1.0,
-            layer="below",
-        )
-    )
-    feet.update_xaxes(
-        range=[0, 390],
-        showgrid=False,
-        zeroline=False,
-        visible=False,
-    )
-    feet.update_yaxes(
-        range=[0, 490],
-        showgrid=False,
-        zeroline=False,
-        visible=False,
-    )
-    return feet
-
-
-def сreate_dynamic_sensors(fig, sensors, sensors_list, cord_x, cord_y):
-    last_sensors = sensors[
-        sensors["measured_at"] == sensors["measured_at"].max()
-    ]
-    fig.add_scatter(
-        x=cord_x,
-        y=cord_y,
-        mode="markers",
-        marker=dict(
-            colorscale=[
-                [0, "rgb(255,255,255)"],
-                [0.2, "rgb(255,133,102)"],
-                [0.4, "rgb(255,112,77)"],
-                [0.6, "rgb(255,92,51)"],
-                [0.8, "rgb(255,71,26)"],
-                [1, "rgb(255,0,0)"],
-            ],
-            color=[last_sensors[f"{s}_val"].item() for s in sensors_list],
-            size=[
-                30
-                + int(
-                    50 * (last_sensors[f"{x}_val"] / sensors[f"{x}_val"].max())
-                )
-                for x in sensors_list
-            ],
-            line=dict(width=2, color="#000000"),
-            showscale=False,
-        ),
-    )
-    for i, s in enumerate(sensors_list):
-        fig.add_annotation(
-            x=cord_x[i],
-            y=cord_y[i],
-            text=last_sensors[f"{s}_val"].item(),
-            showarrow=False,
-            font=dict(
-                family="Courier New, monospace", size=16, color="#000000"
-            ),
-        )
-    return fig
-
-
-def create_sensor_textbox(fig, cord, sensors, sensor_name, x_range):
-    fig.add_shape(
-        type="rect",
-        x0=cord[0],
-        y0=cord[1],
-        x1=cord[2],
-        y1=cord[3],
-        line_color="#636363",
-        line_width=3,
-    )
-
-    if x_range is not None:
-        x_min, x_max = x_range
-        boolean_mask = (sensors["measured_at"] > x_min) & (
-            sensors["measured_at"] <= x_max
-        )
-        sensors = sensors.loc[boolean_mask]
-
-    mean = sensors[f"{sensor_name}_val"].mean()
-    min = sensors[f"{sensor_name}_val"].min()
-    max = sensors[f"{sensor_name}_val"].max()
 
-    text = [
+def format_textbox_lines(sensor_name, mean, min, max):
+    return [
         f"Sensor: {sensor_name}",
         f"Mean: {mean:.2f}",
-        f"Min: {min}",
-        f"Max: {max}",
+        f"Min: {min:.0f}",
+        f"Max: {max:.0f}",
     ]
-    for i, line in enumerate(text):
-        fig.add_annotation(
-            x=(cord[0] + ((cord[2] - cord[0]) / 2)),
-            y=(cord[3] - (i + 1) * ((cord[3] - cord[1]) / (len(text) + 1))),
-            text=line,
-            showarrow=False,
-            font=dict(
-                family="Courier New, monospace", size=16, color="#ffffff"
-            ),
+
+
+def feet_state(sensors, sensors_list, textboxes, x_range, stats=None):
+    # Annotation texts follow the feet template order: marker values
+    # first, then the lines of every textbox.
+    if stats is None:
+        stats = window_stats(sensors, x_range, sensors_list)
+    colors = stats["last"].astype(int).tolist()
+    texts = [str(color) for color in colors]
+    for sensor_name in textboxes:
+        i = sensors_list.index(sensor_name)
+        texts += format_textbox_lines(
+            sensor_name, stats["mean"][i], stats["min"][i], stats["max"][i]
         )
-    return fig
+    return {
+        "colors": colors,
+        "sizes": marker_sizes(stats["last"], stats["window_max"]),
+        "texts": texts,
+    }
 
 
 def create_data_plot():
@@ -147,7 +56,8 @@ def create_data_plot():
 def parse_xaxis_range(plot_x_range):
     x_range = None
     if (
-        "xaxis.range[0]" in plot_x_range.keys()
+        plot_x_range
+        and "xaxis.range[0]" in plot_x_range.keys()
         and "xaxis.range[1]" in plot_x_range.keys()
     ):
         x_range = [
@@ -158,6 +68,9 @@ def parse_xaxis_range(plot_x_range):
 
 
 def update_history_figure(fig, plot_type, sensors, x_range):
+    sensors = downsample_frame(
+        sensors, "measured_at", f"{plot_type}_val", x_range
+    )
     fig = px.line(
         sensors, x="measured_at", y=f"{plot_type}_val", template="plotly_dark"
     )
@@ -168,6 +81,31 @@ def update_history_figure(fig, plot_type, sensors, x_range):
         paper_bgcolor="rgba(0, 0, 0, 0)",
         yaxis=dict(fixedrange=True),
     )
+    if f"{plot_type}_min" in sensors.columns:
+        # Rollup buckets also carry their min / max, drawn as a band
+        # behind the mean (trace 0 stays the one extended live).
+        for bound, fill in (("max", None), ("min", "tonexty")):
+            fig.add_scatter(
+                x=sensors["measured_at"],
+                y=sensors[f"{plot_type}_{bound}"],
+                mode="lines",
+                line=dict(width=0),
+                fill=fill,
+                fillcolor="rgba(99, 110, 250, 0.25)",
+                hoverinfo="skip",
+                showlegend=False,
+            )
+    # Buttons past the live window pull the range from the archive.
+    fig.update_xaxes(
+        rangeselector=dict(
+            buttons=[
+                dict(count=1, label="1h", step="hour", stepmode="backward"),
+                dict(count=1, label="1d", step="day", stepmode="backward"),
+                dict(count=7, label="7d", step="day", stepmode="backward"),
+                dict(label="live", step="all"),
+            ]
+        )
+    )
 
     if x_range is not None:
         fig.update_xaxes(
@@ -177,24 +115,48 @@ def update_history_figure(fig, plot_type, sensors, x_range):
     return fig
 
 
-def update_anomalies_figure(fig, sensor_name, sensors, x_range):
-    sensor_anomalies = sensors[sensors[f"{sensor_name}_anom"] == 1]
-    fig = px.line(
-        sensor_anomalies,
-        x="measured_at",
-        y=f"{sensor_name}_val",
-        template="plotly_dark",
-    )
+def update_anomalies_figure(fig, sensor_name, sensors, x_range, episodes):
+    # The sensor history with its anomaly episodes shaded behind it, so no
+    # raw anomalous rows are sent and unrelated samples are not joined.
+    fig = update_history_figure(fig, sensor_name, sensors, x_range)
+    episodes = episodes[episodes["sensor"] == sensor_name]
     fig.update_layout(
-        height=360,
-        margin=dict(l=0, r=0, t=30, b=0),
-        plot_bgcolor="rgba(0, 0, 0, 0)",
-        paper_bgcolor="rgba(0, 0, 0, 0)",
+        shapes=[
+            dict(
+                type="rect",
+                xref="x",
+                yref="paper",
+                x0=start,
+                x1=until,
+                y0=0,
+                y1=1,
+                fillcolor="rgba(255, 71, 26, 0.3)",
+                line=dict(width=0),
+                layer="below",
+            )
+            for start, until in zip(episodes["start"], episodes["until"])
+        ]
+    )
+    fig.add_scatter(
+        x=episodes["start"],
+        y=episodes["peak"],
+        customdata=episodes[["duration", "samples"]],
+        mode="markers",
+        marker=dict(color="rgb(255,0,0)", size=8),
+        hovertemplate=(
+            "Start: %{x}<br>Peak: %{y}<br>Duration: %{customdata[0]:.0f}s"
+            "<br>Samples: %{customdata[1]}<extra></extra>"
+        ),
+        showlegend=False,
+    )
+    # Anomalous samples that arrive before the next render are appended
+    # here by extendData, as single points without episode details.
+    fig.add_scatter(
+        x=[],
+        y=[],
+        mode="markers",
+        marker=dict(color="rgb(255,0,0)", size=6),
+        hovertemplate="Anomaly: %{x}<br>Value: %{y}<extra></extra>",
+        showlegend=False,
     )
-
-    if x_range is not None:
-        fig.update_xaxes(
-            type="date",
-            range=x_range,
-        )
     return fig
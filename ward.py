@@ -0,0 +1,134 @@
+import numpy as np
+
+from feet_template import (FEET_CORD_X, FEET_CORD_Y, FEET_SENSORS,
+                           SENSOR_COLORSCALE)
+
+WARD_COLUMNS = 8
+TILE_WIDTH = 200
+TILE_HEIGHT = 260
+# Marker positions inside a tile, shifted from the single-patient figure.
+TILE_CORD_X = np.array(FEET_CORD_X) - min(FEET_CORD_X) + 35
+TILE_CORD_Y = np.array(FEET_CORD_Y) - min(FEET_CORD_Y) + 20
+
+_HIDDEN_AXIS = {"showgrid": False, "zeroline": False, "visible": False}
+
+
+def tile_positions(tiles, columns=WARD_COLUMNS):
+    column = np.arange(tiles) % columns
+    row = np.arange(tiles) // columns
+    x = column[:, None] * TILE_WIDTH + TILE_CORD_X
+    y = -row[:, None] * TILE_HEIGHT + TILE_CORD_Y
+    return x, y
+
+
+def build_ward_figure(overview, patients, sensors_list=FEET_SENSORS,
+                      columns=WARD_COLUMNS):
+    # All tiles come from the one overview frame: a single marker trace
+    # for every sensor of every patient plus one label per tile.
+    tiles = len(overview)
+    rows = max(-(-tiles // columns), 1)
+    x, y = tile_positions(tiles, columns)
+    # Offline patients have no readings; their tiles stay, dimmed.
+    values = overview[[f"{s}_val" for s in sensors_list]].to_numpy(
+        dtype=np.float64
+    )
+    anomalous = (
+        overview[[f"{s}_anom" for s in sensors_list]]
+        .fillna(False)
+        .to_numpy(dtype=bool)
+    )
+    means = overview[[f"{s}_mean" for s in sensors_list]].to_numpy(
+        dtype=np.float64
+    )
+    anomalies = (
+        overview[[f"{s}_anomalies" for s in sensors_list]]
+        .fillna(0)
+        .to_numpy()
+    )
+    status = overview["status"].to_numpy()
+    live = np.repeat(status == "live", len(sensors_list))
+
+    names = [
+        f"{patients.at[patient_id, 'firstname']} "
+        f"{patients.at[patient_id, 'lastname']}"
+        if patient_id in patients.index
+        else f"Patient {patient_id}"
+        for patient_id in overview.index
+    ]
+    hover = [
+        f"{name}<br>{sensor}: {value:.0f}<br>Mean: {mean:.2f}"
+        if state != "offline"
+        else f"{name}<br>{sensor}: no data"
+        for name, state, row_values, row_means in zip(
+            names, status, values, means
+        )
+        for sensor, value, mean in zip(sensors_list, row_values, row_means)
+    ]
+    labels = [
+        f"{name} ({int(count)} anomalies)"
+        if state == "live"
+        else f"{name} ({state})"
+        for name, state, count in zip(names, status, anomalies.sum(axis=1))
+    ]
+
+    return {
+        "data": [
+            {
+                "type": "scatter",
+                "x": x.ravel().tolist(),
+                "y": y.ravel().tolist(),
+                "mode": "markers",
+                "hovertext": hover,
+                "hoverinfo": "text",
+                "marker": {
+                    "colorscale": SENSOR_COLORSCALE,
+                    "color": np.nan_to_num(values).ravel().tolist(),
+                    "cmin": 0,
+                    "cmax": int(np.nanmax(values))
+                    if np.isfinite(values).any()
+                    else 1,
+                    "size": 22,
+                    "opacity": np.where(live, 1.0, 0.3).tolist(),
+                    # The latest sample of a sensor is an anomaly.
+                    "line": {
+                        "width": np.where(anomalous, 4, 1).ravel().tolist(),
+                        "color": np.where(
+                            anomalous, "rgb(255,0,0)", "#000000"
+                        ).ravel().tolist(),
+                    },
+                    "showscale": False,
+                },
+            }
+        ],
+        "layout": {
+            "height": rows * TILE_HEIGHT,
+            "margin": {"l": 0, "r": 0, "t": 0, "b": 0},
+            "paper_bgcolor": "Black",
+            "plot_bgcolor": "Black",
+            "xaxis": dict(_HIDDEN_AXIS, range=[0, columns * TILE_WIDTH]),
+            "yaxis": dict(
+                _HIDDEN_AXIS,
+                range=[-(rows - 1) * TILE_HEIGHT, TILE_HEIGHT],
+            ),
+            "annotations": [
+                {
+                    "x": float(tile_x[0] - TILE_CORD_X[0] + TILE_WIDTH / 2),
+                    "y": float(tile_y.max() + 30),
+                    "text": label,
+                    "showarrow": False,
+                    "font": {
+                        "family": "Courier New, monospace",
+                        "size": 12,
+                        "color": "#808080"
+                        if state != "live"
+                        else "#ff471a"
+                        if count
+                        else "#ffffff",
+                    },
+                }
+                for label, state, tile_x, tile_y, count in zip(
+                    labels, status, x, y, anomalies.sum(axis=1)
+                )
+            ],
+        },
+    }